@@ -1,139 +1,864 @@
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Optional
+from app.core.config import settings
 from app.services.pii_service import PIIScrubber
 from app.services.encryption_service import EncryptionService
 from app.services.storage_service import StorageService
 from app.services.vector_service import VectorService
 from app.services.anomaly_service import AnomalyDetector
-from app.services.llm_service import LLMService
+from app.services.anomaly_store import build_snapshot_store
+from app.services.llm_service import LLMService, MAX_INPUT_TOKENS, GENERATION_ERROR_ANSWER
+from app.services.answer_cache import AnswerCache
+from app.services.context_builder import ContextBuilder
+from app.services.chunker import Chunker
+from app.services.inference_backend import loaded_models
+from app.core.executors import get_executor, shutdown_executors, executor_stats, ExecutorSaturated
+from app.core.registry import ServiceRegistry
+from app.core.aws import client_stats
+from app.core.timing import StageTimer
+from app.core.metrics import count_saturation, count_stage_error, observe_request, observe_stage, register_collector
+from app.core.profiler import profiler
+from app.core import tracing
+from concurrent.futures import Future
+import asyncio
+import functools
+import threading
+import json
+import math
 import uuid
+import time
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# Initialize Services
-pii_scrubber = PIIScrubber()
-encryption_service = EncryptionService()
-storage_service = StorageService()
-vector_service = VectorService()
-anomaly_detector = AnomalyDetector()
-llm_service = LLMService()
+def _build_encryption_service() -> EncryptionService:
+    service = EncryptionService()
+    # Failures are logged, not raised, so the API still works while LocalStack is coming up
+    try:
+        service.kms.key_registry.warm()
+    except Exception as e:
+        logger.warning(f"Could not warm KMS key registry: {e}")
+    return service
+
+def _build_vector_service() -> VectorService:
+    service = VectorService()
+    try:
+        service.refresh_collections()
+    except Exception as e:
+        logger.warning(f"Could not load Qdrant collection registry: {e}")
+    return service
+
+# Services are built on first use (or preloaded, see PRELOAD_MODELS), not at import:
+# importing this module no longer loads three models and opens every client.
+services = ServiceRegistry()
+services.register("pii_scrubber", PIIScrubber)
+services.register("encryption_service", _build_encryption_service)
+services.register("storage_service", StorageService)
+services.register("vector_service", _build_vector_service)
+services.register(
+    "anomaly_detector", lambda: AnomalyDetector(store=build_snapshot_store(lambda: services.storage_service))
+)
+services.register("llm_service", LLMService)
+services.register(
+    "context_builder", lambda: ContextBuilder(services.llm_service.generator.tokenizer, MAX_INPUT_TOKENS)
+)
+services.register("chunker", lambda: Chunker(
+    getattr(services.vector_service.model, "tokenizer", None),
+    mode=settings.CHUNK_MODE,
+    max_tokens=settings.CHUNK_MAX_TOKENS,
+    overlap_tokens=settings.CHUNK_OVERLAP_TOKENS
+))
+services.register("answer_cache", lambda: AnswerCache(
+    services.encryption_service,
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+    max_tenants=settings.ANSWER_CACHE_MAX_TENANTS,
+    ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+    similarity=settings.ANSWER_CACHE_SIMILARITY,
+    # Shared by all workers: an ingest anywhere changes the tenant's point count
+    freshness=services.vector_service.count_points
+))
+
+def startup():
+    if settings.PRELOAD_MODELS == "startup":
+        services.preload()
+    elif settings.PRELOAD_MODELS in ("background", "import"):
+        # With "import" the model weights are already in memory; this builds the
+        # services around them (clients, batcher threads) inside the worker.
+        services.preload(background=True)
+
+def shutdown():
+    vector_service = services.peek("vector_service")
+    if vector_service is not None and vector_service.batcher:
+        vector_service.batcher.close()
+    anomaly_detector = services.peek("anomaly_detector")
+    if anomaly_detector is not None:
+        anomaly_detector.close()
+    shutdown_executors()
+
+def _saturated(e: ExecutorSaturated, tenant_id: Optional[str] = None) -> HTTPException:
+    # Shed load instead of queueing without bound; clients should retry shortly.
+    count_saturation(e, tenant_id)
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+def _instrumented(endpoint: str):
+    """
+    Counts and times the handler in the request metrics, labeled with the
+    request's tenant. For /query/stream this covers the work up to the first event.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            with observe_request(endpoint, kwargs["request"].tenant_id):
+                return await handler(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _resource_metrics() -> list:
+    """
+    Gauges read at scrape time from the same counters as /stats. Never loads a service.
+    """
+    executors = executor_stats()
+    families = [
+        ("rag_executor_in_flight", "gauge", "Tasks queued or running on each executor.",
+         [({"executor": name}, stats["in_flight"]) for name, stats in executors.items()]),
+        ("rag_executor_capacity", "gauge", "Tasks an executor accepts before shedding load.",
+         [({"executor": name}, stats["capacity"]) for name, stats in executors.items()]),
+        ("rag_service_loaded", "gauge", "1 once the service (and its model) is loaded.",
+         [({"service": name}, int(state["loaded"])) for name, state in services.status().items()])
+    ]
+
+    caches = []
+    encryption_service = services.peek("encryption_service")
+    if encryption_service is not None:
+        for kind, stats in encryption_service.cache_stats().items():
+            caches.append((f"dek_{kind}", stats))
+    vector_service = services.peek("vector_service")
+    if vector_service is not None:
+        caches.append(("query_embedding", vector_service.query_cache_stats()))
+    answer_cache = services.peek("answer_cache")
+    if answer_cache is not None:
+        caches.append(("answer", answer_cache.stats()))
+    caches = [(name, stats) for name, stats in caches if stats]
+    families.append(("rag_cache_hits", "counter", "Cache hits since start.",
+                     [({"cache": name}, stats["hits"]) for name, stats in caches]))
+    families.append(("rag_cache_misses", "counter", "Cache misses since start.",
+                     [({"cache": name}, stats["misses"]) for name, stats in caches]))
+    return families
+
+register_collector(_resource_metrics)
 
 class IngestRequest(BaseModel):
     tenant_id: str
     text: str
 
+class BatchIngestRequest(BaseModel):
+    tenant_id: str
+    documents: list[str] = Field(..., min_length=1, max_length=settings.INGEST_MAX_DOCUMENTS)
+
 class QueryRequest(BaseModel):
     tenant_id: str
     query: str
+    # Defaults come from QUERY_TOP_K / CONTEXT_TOKEN_BUDGET / CONTEXT_RERANK
+    top_k: int = Field(settings.QUERY_TOP_K, ge=1, le=settings.QUERY_MAX_TOP_K)
+    context_token_budget: Optional[int] = Field(None, ge=1)
+    rerank: Optional[bool] = None
 
 @router.get("/tenants")
-def get_tenants():
+async def get_tenants():
     """
     Returns a list of all registered tenants (based on Vector DB collections).
     """
     try:
-        return vector_service.list_tenants()
+        vector_service = await services.aget("vector_service")
+        return await get_executor("io").run(vector_service.list_tenants)
+    except ExecutorSaturated as e:
+        raise _saturated(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/stats")
+def get_stats():
+    """
+    Returns in-process cache statistics (hit / miss counters) and executor load.
+    Services that are not loaded yet report empty stats (this never loads them).
+    """
+    encryption_service = services.peek("encryption_service")
+    vector_service = services.peek("vector_service")
+    anomaly_detector = services.peek("anomaly_detector")
+    answer_cache = services.peek("answer_cache")
+    return {
+        "dek_cache": encryption_service.cache_stats() if encryption_service is not None else {},
+        "embedding_batcher": vector_service.batcher_stats() if vector_service is not None else {},
+        "query_embedding_cache": vector_service.query_cache_stats() if vector_service is not None else {},
+        "anomaly_batcher": anomaly_detector.batcher_stats() if anomaly_detector is not None else {},
+        "anomaly_history": anomaly_detector.footprint() if anomaly_detector is not None else {},
+        "answer_cache": answer_cache.stats() if answer_cache is not None else {},
+        "executors": executor_stats(),
+        "aws_clients": client_stats()
+    }
+
+@router.get("/ready")
+def get_ready():
+    """
+    Readiness probe: 200 once every service (and its model) is loaded, 503 before.
+    The body reports each service's state either way.
+    """
+    body = {
+        "ready": services.is_ready(),
+        "services": services.status(),
+        "models": loaded_models()
+    }
+    return JSONResponse(status_code=200 if body["ready"] else 503, content=body)
+
+def _debug_enabled():
+    # Dependency for the /debug routes: they do not exist unless PROFILER_ENDPOINTS_ENABLED
+    if not settings.PROFILER_ENDPOINTS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+class ProfilerRequest(BaseModel):
+    interval_ms: float = Field(10.0, ge=1.0, le=1000.0)
+    duration_s: Optional[float] = Field(None, gt=0)
+
+class TracingRequest(BaseModel):
+    enabled: bool
+
+@router.post("/debug/profiler/start", dependencies=[Depends(_debug_enabled)])
+def start_profiler(request: ProfilerRequest):
+    """
+    Starts the sampling profiler on this worker process. It stops by itself after
+    duration_s (at most PROFILER_MAX_DURATION_SECONDS).
+    """
+    duration = min(request.duration_s or settings.PROFILER_MAX_DURATION_SECONDS, settings.PROFILER_MAX_DURATION_SECONDS)
+    try:
+        profiler.start(request.interval_ms, duration)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "started", "interval_ms": request.interval_ms, "duration_s": duration}
+
+@router.post("/debug/profiler/stop", dependencies=[Depends(_debug_enabled)])
+def stop_profiler():
+    profiler.stop()
+    return profiler.report(limit=20)
+
+@router.get("/debug/profiler", dependencies=[Depends(_debug_enabled)])
+def get_profile(limit: int = 50):
+    """
+    The most frequent stacks of the current (or last) profile.
+    """
+    return profiler.report(limit=limit)
+
+@router.get("/debug/profiler/collapsed", dependencies=[Depends(_debug_enabled)])
+def get_profile_collapsed():
+    """
+    The profile as collapsed stacks, for flamegraph.pl or speedscope.
+    """
+    return PlainTextResponse(profiler.collapsed())
+
+@router.post("/debug/tracing", dependencies=[Depends(_debug_enabled)])
+def set_tracing(request: TracingRequest):
+    try:
+        tracing.set_enabled(request.enabled)
+    except RuntimeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"enabled": tracing.is_enabled(), "available": tracing.available()}
+
 @router.post("/ingest")
-def ingest_document(request: IngestRequest):
+@_instrumented("ingest")
+async def ingest_document(request: IngestRequest):
     """
     Secure Ingestion Pipeline:
-    1. Redact PII (ML)
-    2. Encrypt Text (KMS + Local)
-    3. Upload to S3 (LocalStack)
-    4. Embed & Index (Qdrant)
+    1. Redact PII (ML), then split the document into chunks
+    2. Encrypt each chunk (KMS + Local)
+    3. Upload each chunk to S3 (LocalStack)
+    4. Embed & Index each chunk (Qdrant), linked to the document by doc_id
+    Model inference and blocking I/O run on dedicated executors, so the event loop stays free.
+    The response's timings_ms reports the time spent in each stage.
     """
     try:
-        # 1. PII Redaction
-        scrubbed_text = pii_scrubber.scrub(request.text)
+        timer = StageTimer(request.tenant_id)
+        io = get_executor("io")
+        pii_scrubber = await services.aget("pii_scrubber")
+        encryption_service = await services.aget("encryption_service")
+        storage_service = await services.aget("storage_service")
+        vector_service = await services.aget("vector_service")
+        chunker = await services.aget("chunker")
+
+        # 1. PII Redaction (the whole document, so no entity is cut by a chunk border), then chunking
+        with timer.stage("pii_scrub"):
+            scrubbed_text = await get_executor("ner").run(pii_scrubber.scrub, request.text)
+        with timer.stage("chunk"):
+            chunks = [text for _, text in await get_executor("embedding").run(chunker.split, scrubbed_text)]
+        doc_id = str(uuid.uuid4())
         
         # 2. Encryption
-        encryption_result = encryption_service.encrypt_text(request.tenant_id, scrubbed_text)
-        ciphertext = encryption_result["ciphertext"]
-        encrypted_dek = encryption_result["encrypted_dek"]
+        with timer.stage("encrypt"):
+            encryption_results = _raise_first(await encryption_service.encrypt_texts(
+                request.tenant_id, chunks, max_concurrency=settings.INGEST_MAX_WORKERS
+            ))
         
-        # 3. Storage (S3)
-        file_key = f"{request.tenant_id}/{uuid.uuid4()}.enc"
-        s3_uri = storage_service.upload_file(file_key, ciphertext)
+        # 3. Storage (S3), while the chunks are embedded
+        files = [(_chunk_key(request.tenant_id, doc_id, i), r["ciphertext"]) for i, r in enumerate(encryption_results)]
+        s3_uris, vectors = await asyncio.gather(
+            timer.timed("s3_put", storage_service.upload_files(files, max_concurrency=settings.INGEST_MAX_WORKERS)),
+            timer.timed("embed", _embed_chunks(chunks))
+        )
+        _raise_first(s3_uris)
         
         # 4. Vector Indexing
         # Note: We embed the SCRUBBED text, so we can search for it.
         # But we store the ENCRYPTED text in S3.
-        point_id, vector = vector_service.upsert_vector(
-            request.tenant_id, 
-            scrubbed_text, 
-            s3_uri, 
-            encrypted_dek
-        )
+        with timer.stage("qdrant_upsert"):
+            point_ids, _ = await io.run(
+                vector_service.upsert_vectors,
+                request.tenant_id,
+                chunks,
+                s3_uris,
+                [r["encrypted_dek"] for r in encryption_results],
+                vectors,
+                metadata=[_chunk_metadata(doc_id, i, len(chunks)) for i in range(len(chunks))]
+            )
+        _invalidate_answers(request.tenant_id)
         
         return {
             "status": "success", 
-            "point_id": point_id, 
-            "s3_uri": s3_uri,
-            "scrubbed_preview": scrubbed_text
+            "doc_id": doc_id,
+            "chunks": len(chunks),
+            "point_id": point_ids[0],
+            "point_ids": point_ids,
+            "s3_uri": s3_uris[0],
+            "scrubbed_preview": scrubbed_text,
+            "timings_ms": timer.as_ms()
+        }
+    except ExecutorSaturated as e:
+        raise _saturated(e, request.tenant_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/ingest/batch")
+@_instrumented("ingest_batch")
+async def ingest_documents_batch(request: BatchIngestRequest):
+    """
+    Bulk Secure Ingestion Pipeline. Same layers as /ingest, but each stage
+    works on a whole batch of documents:
+    1. Redact PII (batched NER)
+    2. Encrypt Text + Upload to S3 (concurrent KMS / S3 calls)
+    3. Embed & Index (one encode call + one multi-point upsert per batch)
+    Failures are reported per document instead of failing the whole request.
+    If an executor is saturated after some batches were already indexed, the
+    remaining documents are reported as "rejected" (not indexed, safe to resend)
+    instead of failing the request with a 503 that would hide the stored ones.
+    """
+    try:
+        timer = StageTimer(request.tenant_id)
+        results = []
+        batch_size = settings.INGEST_BATCH_SIZE
+        for start in range(0, len(request.documents), batch_size):
+            batch = request.documents[start:start + batch_size]
+            try:
+                results.extend(await _ingest_batch(request.tenant_id, batch, offset=start, timer=timer))
+            except ExecutorSaturated as e:
+                if not any(r["status"] == "success" for r in results):
+                    # Nothing indexed yet: the client can simply retry the whole request
+                    raise
+                count_saturation(e, request.tenant_id)
+                results.extend(
+                    {"index": i, "status": "rejected", "detail": str(e)}
+                    for i in range(start, len(request.documents))
+                )
+                break
+
+        failed = sum(1 for r in results if r["status"] != "success")
+        rejected = sum(1 for r in results if r["status"] == "rejected")
+        return {
+            "status": "success" if failed == 0 else ("failed" if failed == len(results) else "partial"),
+            "ingested": len(results) - failed,
+            "failed": failed,
+            "rejected": rejected,
+            "results": results,
+            "timings_ms": timer.as_ms()
         }
+    except ExecutorSaturated as e:
+        raise _saturated(e, request.tenant_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _ingest_batch(tenant_id: str, texts: list[str], offset: int, timer: StageTimer) -> list[dict]:
+    """
+    Runs one batch through the ingestion pipeline. Returns one result per document.
+    Documents are scrubbed whole and then chunked; the later stages work on all
+    chunks of the batch at once. A document is only indexed if every one of its
+    chunks was encrypted and stored. Stage times are added to timer.
+    """
+    results = [{"index": offset + i, "status": "error"} for i in range(len(texts))]
+    io = get_executor("io")
+    pii_scrubber = await services.aget("pii_scrubber")
+    encryption_service = await services.aget("encryption_service")
+    storage_service = await services.aget("storage_service")
+    vector_service = await services.aget("vector_service")
+    anomaly_detector = await services.aget("anomaly_detector")
+    chunker = await services.aget("chunker")
+
+    # 1. PII Redaction (one batched NER call), then chunking. If either fails, the whole batch fails.
+    try:
+        with timer.stage("pii_scrub"):
+            scrubbed_texts = await get_executor("ner").run(
+                pii_scrubber.scrub_batch, texts, batch_size=settings.INGEST_BATCH_SIZE
+            )
+        with timer.stage("chunk"):
+            doc_chunks = await get_executor("embedding").run(chunker.split_batch, scrubbed_texts)
+    except ExecutorSaturated:
+        raise
+    except Exception as e:
+        for r in results:
+            r["detail"] = f"PII redaction / chunking failed: {e}"
+        return results
+
+    doc_ids = [str(uuid.uuid4()) for _ in texts]
+    # (document index, chunk index, chunk text) for every chunk of the batch
+    chunks = [(i, j, text) for i, doc in enumerate(doc_chunks) for j, (_, text) in enumerate(doc)]
+    failed = set()
+
+    # 2. Encryption (KMS calls in parallel)
+    with timer.stage("encrypt"):
+        encryption_results = await encryption_service.encrypt_texts(
+            tenant_id, [text for _, _, text in chunks], max_concurrency=settings.INGEST_MAX_WORKERS
+        )
+    for (i, _, _), encryption_result in zip(chunks, encryption_results):
+        if isinstance(encryption_result, Exception) and i not in failed:
+            failed.add(i)
+            results[i]["detail"] = f"Encryption failed: {encryption_result}"
+    pending = [k for k, (i, _, _) in enumerate(chunks) if i not in failed]
+
+    # 3. Storage (S3 uploads in parallel)
+    with timer.stage("s3_put"):
+        upload_results = await storage_service.upload_files(
+            [(_chunk_key(tenant_id, doc_ids[chunks[k][0]], chunks[k][1]), encryption_results[k]["ciphertext"]) for k in pending],
+            max_concurrency=settings.INGEST_MAX_WORKERS
+        )
+    s3_uris = {}
+    for k, upload_result in zip(pending, upload_results):
+        i = chunks[k][0]
+        if isinstance(upload_result, Exception):
+            if i not in failed:
+                failed.add(i)
+                results[i]["detail"] = f"S3 upload failed: {upload_result}"
+        else:
+            s3_uris[k] = upload_result
+    stored = [k for k in pending if chunks[k][0] not in failed]
+
+    if not stored:
+        return results
+
+    # 4. Vector Indexing (one encode call + one multi-point upsert)
+    try:
+        stored_texts = [chunks[k][2] for k in stored]
+        with timer.stage("embed"):
+            vectors = await get_executor("embedding").run(
+                vector_service.embed_texts, stored_texts, batch_size=settings.INGEST_BATCH_SIZE
+            )
+        with timer.stage("qdrant_upsert"):
+            point_ids, _ = await io.run(
+                vector_service.upsert_vectors,
+                tenant_id,
+                stored_texts,
+                [s3_uris[k] for k in stored],
+                [encryption_results[k]["encrypted_dek"] for k in stored],
+                vectors,
+                metadata=[
+                    _chunk_metadata(doc_ids[chunks[k][0]], chunks[k][1], len(doc_chunks[chunks[k][0]])) for k in stored
+                ]
+            )
+    except ExecutorSaturated:
+        raise
+    except Exception as e:
+        for i in {chunks[k][0] for k in stored}:
+            results[i]["detail"] = f"Vector indexing failed: {e}"
+        return results
+    _invalidate_answers(tenant_id)
+
+    # 5. Score the whole batch against the tenant's query profile in one vectorized call.
+    # Informational only: documents far from what the tenant usually asks about score high.
+    # A document scores as its most unusual chunk.
+    # The documents are already stored, so a scoring failure must not fail them.
+    try:
+        with timer.stage("anomaly_score"):
+            anomaly_scores = await get_executor("anomaly").run(anomaly_detector.score_batch, tenant_id, vectors)
+    except Exception as e:
+        logger.warning(f"Could not score ingest batch for {tenant_id}: {e}")
+        anomaly_scores = [math.nan] * len(stored)
+
+    for k, point_id, anomaly_score in zip(stored, point_ids, anomaly_scores):
+        i = chunks[k][0]
+        result = results[i]
+        if result["status"] != "success":
+            result.update({
+                "status": "success",
+                "doc_id": doc_ids[i],
+                "chunks": len(doc_chunks[i]),
+                "point_id": point_id,
+                "point_ids": [],
+                "s3_uri": s3_uris[k],
+                "scrubbed_preview": scrubbed_texts[i],
+                "anomaly_score": None
+            })
+        result["point_ids"].append(point_id)
+        if not math.isnan(anomaly_score):
+            score = round(float(anomaly_score), 4)
+            result["anomaly_score"] = score if result["anomaly_score"] is None else max(result["anomaly_score"], score)
+    return results
+
+def _chunk_key(tenant_id: str, doc_id: str, chunk_index: int) -> str:
+    return f"{tenant_id}/{doc_id}/{chunk_index}.enc"
+
+def _chunk_metadata(doc_id: str, chunk_index: int, chunk_count: int) -> dict:
+    # Payload linking a chunk's point to its document
+    return {"parent_doc_id": doc_id, "chunk_index": chunk_index, "chunk_count": chunk_count}
+
+def _raise_first(results: list) -> list:
+    """
+    Re-raises the first exception of a map_concurrently result list.
+    """
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+    return results
+
+def _fetch_document(res, tenant_id: str) -> dict:
+    """
+    Fetches and decrypts a single search hit, timing each step.
+    """
+    storage_service = services.storage_service
+    encryption_service = services.encryption_service
+    payload = res.payload
+    s3_uri = payload["s3_uri"]
+    # Only set for objects in the legacy Fernet format
+    encrypted_dek_hex = payload.get("encrypted_dek_hex")
+
+    # 3. Fetch from S3
+    # s3://bucket/key -> extract key
+    started = time.perf_counter()
+    file_key = s3_uri.replace(f"s3://{storage_service.bucket}/", "")
+    with observe_stage("s3_get", tenant_id):
+        encrypted_data = storage_service.download_file(file_key)
+    fetched = time.perf_counter()
+
+    # 4. Decrypt
+    encrypted_dek = bytes.fromhex(encrypted_dek_hex) if encrypted_dek_hex else None
+    plaintext = encryption_service.decrypt_text(encrypted_data, encrypted_dek, tenant_id=tenant_id)
+    decrypted = time.perf_counter()
+
+    return {
+        "score": res.score,
+        "content": plaintext,
+        "s3_uri": s3_uri,
+        # Documents ingested before chunking have no parent document
+        "doc_id": payload.get("parent_doc_id"),
+        "chunk_index": payload.get("chunk_index"),
+        "latency_ms": {
+            "s3_get": round((fetched - started) * 1000, 2),
+            "decrypt": round((decrypted - fetched) * 1000, 2)
+        }
+    }
+
 @router.post("/query")
-def query_document(request: QueryRequest):
+@_instrumented("query")
+async def query_document(request: QueryRequest):
     """
     Secure Retrieval Pipeline:
     1. Anomaly Check (ML)
     2. Vector Search (Qdrant)
     3. Fetch Encrypted Blob (S3)
     4. Decrypt (KMS)
+    5. Generate Answer (LLM)
+    Model inference and blocking I/O run on dedicated executors, so the event loop stays free.
+    Steps 2-5 are skipped when the tenant's answer cache has a semantically equivalent query.
+    The response's timings_ms reports the time spent in each stage.
     """
     try:
-        # 1. Anomaly Detection (Pre-search)
-        # We need the query vector to check for anomalies.
-        query_vector = vector_service.embed_text(request.query)
-        
-        # Log and check
-        anomaly_detector.log_query(request.tenant_id, query_vector)
-        if anomaly_detector.is_anomalous(request.tenant_id, query_vector):
-            # In a real app, we might block. For PoC, we flag it in response.
-            print(f"DEBUG: Anomaly DETECTED for {request.tenant_id}")
-            is_flagged = True
-        else:
-            print(f"DEBUG: Query normal for {request.tenant_id}")
-            is_flagged = False
+        timer = StageTimer(request.tenant_id)
+        llm_service = await services.aget("llm_service")
+        query_vector, screening = await _screen_query(request, timer)
+
+        with timer.stage("answer_cache"):
+            cached, stamp = await _cached_answer(request, query_vector)
+        if cached is not None:
+            return {**cached, **screening, "cached": True, "timings_ms": timer.as_ms()}
+
+        retrieved, vectors = await _retrieve(request, query_vector, timer)
 
-        # 2. Vector Search
-        search_results, _ = vector_service.search(request.tenant_id, request.query)
-        
-        documents = []
-        for res in search_results:
-            payload = res.payload
-            s3_uri = payload["s3_uri"]
-            encrypted_dek_hex = payload["encrypted_dek_hex"]
-            
-            # 3. Fetch from S3
-            # s3://bucket/key -> extract key
-            file_key = s3_uri.replace(f"s3://{storage_service.bucket}/", "")
-            encrypted_data = storage_service.download_file(file_key)
-            
-            # 4. Decrypt
-            encrypted_dek = bytes.fromhex(encrypted_dek_hex)
-            plaintext = encryption_service.decrypt_text(encrypted_data, encrypted_dek)
-            
-            documents.append({
-                "score": res.score,
-                "content": plaintext,
-                "s3_uri": s3_uri
-            })
-            
         # 5. Generate Answer (RAG)
-        context = " ".join([doc["content"] for doc in documents])
-        generated_answer = llm_service.generate_answer(context, request.query)
+        with timer.stage("context"):
+            context = await _build_context(request, retrieved, vectors)
+        with timer.stage("llm_generate"):
+            generated_answer = await get_executor("llm").run(llm_service.generate_answer, context, request.query)
 
-        return {
-            "results": documents,
-            "generated_answer": generated_answer,
-            "anomaly_detected": is_flagged
-        }
+        response = {**retrieved, "generated_answer": generated_answer}
+        _cache_answer(request, query_vector, response, stamp, screening)
+        return {**response, **screening, "cached": False, "timings_ms": timer.as_ms()}
 
+    except ExecutorSaturated as e:
+        raise _saturated(e, request.tenant_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/query/stream")
+@_instrumented("query_stream")
+async def query_document_stream(request: QueryRequest, http_request: Request):
+    """
+    Same pipeline as /query, streamed as Server-Sent Events:
+    - "documents": the decrypted results and the anomaly flag, sent as soon as retrieval is done
+    - "token":     each piece of the answer as the LLM produces it
+    - "done":      the full generated answer
+    - "error":     generation failed after the stream started
+    Retrieval errors (and a saturated LLM executor) are still returned as plain HTTP errors.
+    A cached answer is sent as a single "token" event.
+    The "documents" event's timings_ms covers the stages before generation.
+    If the client disconnects, generation stops after the current token.
+    """
+    try:
+        timer = StageTimer(request.tenant_id)
+        llm_service = await services.aget("llm_service")
+        query_vector, screening = await _screen_query(request, timer)
+
+        with timer.stage("answer_cache"):
+            cached, stamp = await _cached_answer(request, query_vector)
+        if cached is None:
+            retrieved, vectors = await _retrieve(request, query_vector, timer)
+
+            # Generation starts now, on the LLM executor, writing into the streamer
+            with timer.stage("context"):
+                context = await _build_context(request, retrieved, vectors)
+            streamer = llm_service.create_streamer()
+            cancelled = threading.Event()
+            generation_future = get_executor("llm").submit(
+                llm_service.generate_into, context, request.query, streamer, cancelled
+            )
+    except ExecutorSaturated as e:
+        raise _saturated(e, request.tenant_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def cached_events():
+        answer = cached.pop("generated_answer")
+        yield _sse("documents", {**cached, **screening, "cached": True, "timings_ms": timer.as_ms()})
+        yield _sse("token", {"text": answer})
+        yield _sse("done", {"generated_answer": answer})
+
+    async def events():
+        yield _sse("documents", {**retrieved, **screening, "cached": False, "timings_ms": timer.as_ms()})
+
+        stream_executor = get_executor("stream")
+        pieces = []
+        try:
+            # Each next() blocks until the model has decoded more text
+            tokens = iter(streamer)
+            while (text := await stream_executor.run(next, tokens, None)) is not None:
+                if await http_request.is_disconnected():
+                    logger.info(f"Client disconnected, stopping generation for {request.tenant_id}")
+                    return
+                if text:
+                    pieces.append(text)
+                    yield _sse("token", {"text": text})
+            await asyncio.wrap_future(generation_future)
+        except Exception as e:
+            logger.error(f"Streaming generation failed for {request.tenant_id}: {e}")
+            if isinstance(e, ExecutorSaturated):
+                count_saturation(e, request.tenant_id)
+            else:
+                count_stage_error("llm_generate", request.tenant_id)
+            yield _sse("error", {"detail": str(e) or type(e).__name__})
+            return
+        finally:
+            # Also reached when the response task is cancelled (CancelledError) or the
+            # generator is closed; either way the model must stop decoding for nobody.
+            cancelled.set()
+        generated_answer = "".join(pieces)
+        _cache_answer(request, query_vector, {**retrieved, "generated_answer": generated_answer}, stamp, screening)
+        yield _sse("done", {"generated_answer": generated_answer})
+
+    return StreamingResponse(
+        cached_events() if cached is not None else events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _screen_query(request: QueryRequest, timer: StageTimer) -> tuple[list[float], dict]:
+    """
+    Step 1, run for every query (cached or not): embeds the query, logs it and
+    scores it against the tenant's anomaly model.
+    Returns the query vector and the anomaly fields of the response.
+    """
+    # 1. Anomaly Detection (Pre-search)
+    # We need the query vector to check for anomalies.
+    with timer.stage("embed"):
+        query_vector = await _embed(request.query, query=True)
+    
+    # Log and check
+    with timer.stage("anomaly_score"):
+        anomaly_score = await _score_anomaly(request.tenant_id, query_vector)
+    # NaN (no model yet for this tenant) compares False: fail open
+    is_flagged = bool(anomaly_score > 0)
+    if is_flagged:
+        # In a real app, we might block. For PoC, we flag it in response.
+        logger.warning(f"Anomalous query for {request.tenant_id} (score {anomaly_score:.4f})")
+    else:
+        logger.debug(f"Query normal for {request.tenant_id}")
+
+    return query_vector, {
+        "anomaly_detected": is_flagged,
+        "anomaly_score": None if math.isnan(anomaly_score) else round(anomaly_score, 4)
+    }
+
+async def _retrieve(request: QueryRequest, query_vector: list[float], timer: StageTimer) -> tuple[dict, list]:
+    """
+    Steps 2-4 of the retrieval pipeline: vector search, then fetch + decrypt of
+    every hit. Returns the response fields and the hits' stored vectors (used to
+    drop near-duplicates from the context).
+    """
+    io = get_executor("io")
+    vector_service = await services.aget("vector_service")
+
+    # 2. Vector Search
+    with timer.stage("qdrant_search"):
+        search_results, _ = await io.run(
+            vector_service.search, request.tenant_id, request.query,
+            limit=request.top_k, query_vector=query_vector, with_vectors=True
+        )
+    
+    # 3 + 4. Fetch from S3 and decrypt, up to QUERY_FETCH_WORKERS hits at a time.
+    # gather keeps input order, so documents stay sorted by score.
+    fetch_slots = asyncio.Semaphore(settings.QUERY_FETCH_WORKERS)
+
+    async def fetch(res):
+        async with fetch_slots:
+            return await io.run(_fetch_document, res, request.tenant_id)
+
+    with timer.stage("fetch_decrypt"):
+        documents = await asyncio.gather(*(fetch(res) for res in search_results))
+    return {"results": documents}, [res.vector for res in search_results]
+
+def _answer_options(request: QueryRequest) -> tuple:
+    # Answers only match queries asked with the same retrieval options
+    return (request.top_k, request.context_token_budget, request.rerank)
+
+async def _cached_answer(request: QueryRequest, query_vector: list[float]) -> tuple[dict, tuple]:
+    """
+    Looks the query up in the tenant's answer cache. Returns (response or None, stamp for _cache_answer).
+    On a miss the tenant's freshness token is read on the io executor while the answer
+    is computed, so the read stays off the request's critical path.
+    """
+    answer_cache = await services.aget("answer_cache")
+    if not answer_cache.enabled:
+        return None, None
+    cached, (generation, freshness) = await get_executor("io").run(
+        answer_cache.get, request.tenant_id, query_vector, _answer_options(request)
+    )
+    if cached is not None:
+        return cached, None
+    if freshness is not None:
+        future = Future()
+        future.set_result(freshness)
+    else:
+        try:
+            future = get_executor("io").submit(answer_cache.read_freshness, request.tenant_id)
+        except ExecutorSaturated:
+            return None, None
+    return None, (generation, future)
+
+def _cache_answer(request: QueryRequest, query_vector: list[float], response: dict, stamp: tuple, screening: dict):
+    """
+    Stores the answer in the background (encryption needs a KMS data key), once the
+    freshness token read before generation is available.
+    Flagged queries and failed generations are not cached.
+    """
+    answer_cache = services.peek("answer_cache")
+    if answer_cache is None or not answer_cache.enabled or stamp is None:
+        return
+    if screening["anomaly_detected"] or response["generated_answer"] == GENERATION_ERROR_ANSWER:
+        return
+
+    generation, freshness = stamp
+
+    def store(future: Future):
+        try:
+            get_executor("io").submit(
+                answer_cache.put, request.tenant_id, query_vector, _answer_options(request), response,
+                (generation, future.result())
+            )
+        except ExecutorSaturated:
+            pass
+    freshness.add_done_callback(store)
+
+def _invalidate_answers(tenant_id: str):
+    answer_cache = services.peek("answer_cache")
+    if answer_cache is not None:
+        answer_cache.invalidate(tenant_id)
+
+async def _build_context(request: QueryRequest, retrieved: dict, vectors: list) -> str:
+    """
+    Dedupes, optionally reranks and packs the decrypted hits into the LLM's token
+    budget. Adds the build summary to the response as "context".
+    """
+    llm_service = await services.aget("llm_service")
+    context_builder = await services.aget("context_builder")
+    # Tokenizing and reranking are short model calls: run them with the embeddings,
+    # not behind the generations queued on the single LLM worker
+    context, retrieved["context"] = await get_executor("embedding").run(
+        context_builder.build,
+        request.query,
+        retrieved["results"],
+        vectors,
+        llm_service.build_prompt("", request.query),
+        token_budget=request.context_token_budget,
+        rerank=request.rerank
+    )
+    return context
+
+async def _embed(text: str, query: bool = False) -> list[float]:
+    """
+    Embeds one text. With micro-batching enabled the request joins the batcher
+    queue directly, so concurrent requests share a single forward pass.
+    Search queries (query=True) go through the query embedding cache, so repeated
+    queries skip the model.
+    """
+    vector_service = await services.aget("vector_service")
+    if query:
+        vector = vector_service.get_cached_query_vector(text)
+        if vector is not None:
+            return vector
+    if vector_service.batcher:
+        vector = await asyncio.wrap_future(vector_service.batcher.submit(text))
+    else:
+        vector = await get_executor("embedding").run(vector_service.embed_text, text)
+    if query:
+        vector_service.cache_query_vector(text, vector)
+    return vector
+
+async def _embed_chunks(chunks: list[str]) -> list[list[float]]:
+    """
+    Embeds the chunks of one document: a single chunk goes through the micro-batcher
+    like any other text, several are encoded in one call.
+    """
+    if len(chunks) == 1:
+        return [await _embed(chunks[0])]
+    vector_service = await services.aget("vector_service")
+    return await get_executor("embedding").run(vector_service.embed_texts, chunks, batch_size=settings.INGEST_BATCH_SIZE)
+
+async def _score_anomaly(tenant_id: str, query_vector: list[float]) -> float:
+    """
+    Logs the query and returns its anomaly score (> 0 is anomalous, NaN if the
+    tenant has no model yet). With batching enabled, concurrent queries are
+    scored together in one vectorized call.
+    """
+    anomaly_detector = await services.aget("anomaly_detector")
+    if anomaly_detector.batcher:
+        return await asyncio.wrap_future(anomaly_detector.batcher.submit((tenant_id, query_vector)))
+    scores = await get_executor("anomaly").run(anomaly_detector.log_and_score, tenant_id, [query_vector])
+    return float(scores[0])
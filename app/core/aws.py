@@ -0,0 +1,147 @@
+import threading
+import logging
+import boto3
+from botocore.config import Config
+from app.core.config import settings
+from app.core.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+AWS_RETRY_MODES = ("legacy", "standard", "adaptive")
+
+# One session and one client per AWS service for the whole process. boto3 clients
+# are thread-safe; building them (and sessions) is not, hence the lock.
+_session = None
+_clients = {}
+_pools = {}
+_lock = threading.Lock()
+
+
+class ClientPoolStats:
+    """
+    Calls in flight on one client, fed by botocore events. Calls beyond
+    max_pool_connections wait for a free connection, so in_flight going above the
+    pool size (counted in saturated) means the pool is the bottleneck.
+    """
+    def __init__(self, pool_size: int):
+        self.pool_size = pool_size
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.saturated = 0
+        self._lock = threading.Lock()
+
+    def before_call(self, **kwargs):
+        with self._lock:
+            self.in_flight += 1
+            self.calls += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            if self.in_flight > self.pool_size:
+                self.saturated += 1
+
+    def after_call(self, parsed=None, **kwargs):
+        retries = (parsed or {}).get("ResponseMetadata", {}).get("RetryAttempts", 0)
+        with self._lock:
+            self.in_flight -= 1
+            self.retries += retries
+
+    def after_call_error(self, **kwargs):
+        with self._lock:
+            self.in_flight -= 1
+            self.errors += 1
+
+    def stats(self) -> dict:
+        return {
+            "pool_size": self.pool_size,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "saturated": self.saturated
+        }
+
+
+def client_config() -> Config:
+    """
+    botocore settings shared by every client, from Settings.
+    """
+    if settings.AWS_RETRY_MODE not in AWS_RETRY_MODES:
+        raise ValueError(f"AWS_RETRY_MODE must be one of {AWS_RETRY_MODES}, got {settings.AWS_RETRY_MODE!r}")
+    return Config(
+        region_name=settings.AWS_REGION,
+        max_pool_connections=settings.AWS_MAX_POOL_CONNECTIONS,
+        retries={"mode": settings.AWS_RETRY_MODE, "max_attempts": settings.AWS_MAX_ATTEMPTS},
+        connect_timeout=settings.AWS_CONNECT_TIMEOUT_SECONDS,
+        read_timeout=settings.AWS_READ_TIMEOUT_SECONDS,
+        tcp_keepalive=settings.AWS_TCP_KEEPALIVE
+    )
+
+
+def get_client(service_name: str):
+    """
+    The process-wide boto3 client for service_name ("s3", "kms"), created on first use.
+    """
+    client = _clients.get(service_name)
+    if client is not None:
+        return client
+
+    global _session
+    with _lock:
+        if service_name not in _clients:
+            if _session is None:
+                _session = boto3.session.Session(
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    region_name=settings.AWS_REGION
+                )
+            client = _session.client(service_name, endpoint_url=settings.AWS_ENDPOINT_URL, config=client_config())
+
+            pool = ClientPoolStats(settings.AWS_MAX_POOL_CONNECTIONS)
+            client.meta.events.register("before-call", pool.before_call)
+            client.meta.events.register("after-call", pool.after_call)
+            client.meta.events.register("after-call-error", pool.after_call_error)
+
+            _pools[service_name] = pool
+            _clients[service_name] = client
+            logger.info(f"Created {service_name} client (pool {settings.AWS_MAX_POOL_CONNECTIONS}, retries {settings.AWS_RETRY_MODE})")
+        return _clients[service_name]
+
+
+def client_stats() -> dict:
+    with _lock:
+        return {name: pool.stats() for name, pool in _pools.items()}
+
+
+def reset_clients():
+    """
+    Drops the cached session and clients (e.g. after changing AWS settings in tests).
+    """
+    global _session
+    with _lock:
+        _session = None
+        _clients.clear()
+        _pools.clear()
+
+
+def _pool_metrics() -> list:
+    pools = client_stats()
+    families = [
+        ("rag_aws_in_flight", "gauge", "AWS API calls in flight per client.",
+         [({"service": name}, stats["in_flight"]) for name, stats in pools.items()]),
+        ("rag_aws_pool_connections", "gauge", "max_pool_connections of each AWS client.",
+         [({"service": name}, stats["pool_size"]) for name, stats in pools.items()])
+    ]
+    for key, help_text in (
+        ("calls", "AWS API calls."),
+        ("errors", "AWS API calls that raised."),
+        ("retries", "Retry attempts made by botocore."),
+        ("saturated", "Calls started while every pooled connection was busy.")
+    ):
+        families.append((f"rag_aws_{key}_total", "counter", help_text,
+                         [({"service": name}, stats[key]) for name, stats in pools.items()]))
+    return families
+
+register_collector(_pool_metrics)
@@ -0,0 +1,110 @@
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import Future
+from typing import Any, Callable
+from app.core.executors import ExecutorSaturated
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching: concurrent submit() calls are collected for up to
+    max_wait_ms (or until max_batch_size items are waiting) and handed to
+    process_batch(items) in a single call. process_batch must return one result
+    per item, in order; each caller gets its own result through a Future.
+    """
+    def __init__(self, name: str, process_batch: Callable[[list], list], max_batch_size: int,
+                 max_wait_ms: float, max_queue_size: int = 0):
+        self.name = name
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._total_queue_delay = 0.0
+        self._max_queue_delay = 0.0
+        self._thread = threading.Thread(target=self._run, name=f"{name}-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        future = Future()
+        try:
+            self._queue.put_nowait((item, future, time.monotonic()))
+        except queue.Full:
+            raise ExecutorSaturated(f"The '{self.name}' batcher queue is full", self.name)
+        return future
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def stats(self) -> dict:
+        with self._lock:
+            avg_batch_size = self._items / self._batches if self._batches else 0.0
+            return {
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": avg_batch_size,
+                "avg_batch_fill": avg_batch_size / self.max_batch_size,
+                "avg_queue_delay_ms": self._total_queue_delay / self._items * 1000 if self._items else 0.0,
+                "max_queue_delay_ms": self._max_queue_delay * 1000,
+                "queued": self._queue.qsize()
+            }
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            batch = [first]
+            # The wait window starts when the oldest item was submitted
+            deadline = first[2] + self.max_wait
+            closing = False
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    entry = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if entry is None:
+                    closing = True
+                    break
+                batch.append(entry)
+
+            self._process(batch)
+            if closing:
+                return
+
+    def _process(self, batch: list):
+        # Skip callers that gave up (e.g. a cancelled request) before we got to them
+        batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        started = time.monotonic()
+        with self._lock:
+            self._batches += 1
+            self._items += len(batch)
+            for _, _, enqueued_at in batch:
+                delay = started - enqueued_at
+                self._total_queue_delay += delay
+                self._max_queue_delay = max(self._max_queue_delay, delay)
+
+        try:
+            results = self.process_batch([item for item, _, _ in batch])
+        except Exception as e:
+            logger.error(f"{self.name} batch of {len(batch)} failed: {e}")
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future, _), result in zip(batch, results):
+            future.set_result(result)
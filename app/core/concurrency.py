@@ -0,0 +1,35 @@
+import asyncio
+from typing import Callable, Iterable
+from app.core.executors import BoundedExecutor, ExecutorSaturated
+
+
+async def map_concurrently(executor: BoundedExecutor, fn: Callable, arg_tuples: Iterable[tuple],
+                           max_concurrency: int = 8) -> list:
+    """
+    Calls fn(*args) for every args tuple on a shared executor (meant for blocking network
+    calls such as S3 or KMS on the "io" executor), at most max_concurrency at a time.
+    The fan-out is driven from the event loop, so no executor thread blocks waiting on
+    other tasks, and the executor's bounded queue still applies: if it is full,
+    ExecutorSaturated is raised (calls already started finish in the background).
+    Returns one entry per call, in input order: the result on success or the raised
+    exception on failure, so one bad item does not sink the whole batch.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    saturated = []
+
+    async def call(args: tuple):
+        async with semaphore:
+            if saturated:
+                return saturated[0]
+            try:
+                return await executor.run(fn, *args)
+            except ExecutorSaturated as e:
+                saturated.append(e)
+                return e
+            except Exception as e:
+                return e
+
+    results = await asyncio.gather(*(call(args) for args in arg_tuples))
+    if saturated:
+        raise saturated[0]
+    return list(results)
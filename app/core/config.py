@@ -11,12 +11,137 @@ class Settings(BaseSettings):
     AWS_SECRET_ACCESS_KEY: str = "test"
     AWS_ENDPOINT_URL: str = "http://localhost:4566" # LocalStack endpoint
     
+    # AWS client pool: one S3 and one KMS client per process (app/core/aws.py)
+    AWS_MAX_POOL_CONNECTIONS: int = 64     # Per client; IO_WORKERS threads (plus batch fan-out) may call at once
+    AWS_RETRY_MODE: str = "adaptive"       # "legacy", "standard" or "adaptive" (client-side rate limiting on throttling)
+    AWS_MAX_ATTEMPTS: int = 5              # Including the first attempt
+    AWS_CONNECT_TIMEOUT_SECONDS: float = 2.0
+    AWS_READ_TIMEOUT_SECONDS: float = 10.0
+    AWS_TCP_KEEPALIVE: bool = True         # Keep idle pooled connections alive
+
     # S3 Config
     S3_BUCKET_NAME: str = "secure-rag-data"
     
+    # Executors (async request path)
+    # Model inference and blocking I/O run on dedicated thread pools with bounded queues.
+    NER_WORKERS: int = 1
+    EMBEDDING_WORKERS: int = 1
+    LLM_WORKERS: int = 1
+    ANOMALY_WORKERS: int = 1
+    IO_WORKERS: int = 32               # boto3 (S3 / KMS) and Qdrant calls
+    STREAM_WORKERS: int = 16           # Waits for the next piece of a streamed answer (/query/stream)
+    EXECUTOR_QUEUE_SIZE: int = 64      # Tasks allowed to wait per executor before returning 503
+
+    # Embedding Micro-Batching
+    # Concurrent embed_text calls are collected and encoded in one forward pass.
+    EMBEDDING_BATCHING_ENABLED: bool = True
+    EMBEDDING_BATCH_MAX_SIZE: int = 32
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = 5.0
+
+    # Query Embedding Cache (keyed by normalized query text; size 0 disables it)
+    QUERY_EMBEDDING_CACHE_SIZE: int = 10000
+    QUERY_EMBEDDING_CACHE_TTL_SECONDS: float = 3600.0
+
+    # Anomaly Detection
+    ANOMALY_ENGINE: str = "isolation_forest"     # "isolation_forest" (background refits) or "centroid" (online, O(d))
+    ANOMALY_CENTROID_SIGMAS: float = 3.0         # centroid: flag distances beyond mean + N std
+    ANOMALY_MIN_SAMPLES: int = 5                 # Queries needed before a tenant gets a model
+    ANOMALY_HISTORY_SIZE: int = 1000             # Ring buffer of query embeddings per tenant
+    ANOMALY_HISTORY_DIR: str = ""                # If set, history buffers are memory-mapped files here (one subdirectory per worker)
+    ANOMALY_RETRAIN_EVERY: int = 50              # Retrain after this many new queries...
+    ANOMALY_RETRAIN_INTERVAL_SECONDS: float = 60.0  # ...or after this long if any arrived
+    # Concurrent query checks are scored in one vectorized call
+    ANOMALY_BATCHING_ENABLED: bool = True
+    ANOMALY_BATCH_MAX_SIZE: int = 64
+    ANOMALY_BATCH_MAX_WAIT_MS: float = 2.0
+    # Snapshots of models + history, shared across restarts and workers
+    ANOMALY_SNAPSHOT_BACKEND: str = "none"       # "none", "local" or "s3" (via StorageService)
+    ANOMALY_SNAPSHOT_DIR: str = "anomaly_snapshots"
+    ANOMALY_SNAPSHOT_INTERVAL_SECONDS: float = 300.0
+    ANOMALY_MODEL_REFRESH_SECONDS: float = 60.0  # How often workers look for newer snapshots
+
+    # Retrieval
+    QUERY_FETCH_WORKERS: int = 8  # Concurrent S3 fetch + decrypt calls per query
+
+    # Encryption
+    ENCRYPTION_FORMAT: str = "envelope"      # New objects: "envelope" (binary AES-256-GCM) or "fernet" (legacy); both are readable
+
+    # Data Key (DEK) Cache
+    DEK_CACHE_ENABLED: bool = True
+    DEK_CACHE_MAX_ENTRIES: int = 1000        # Per side (encrypt / decrypt)
+    DEK_CACHE_MAX_AGE_SECONDS: float = 300.0
+    DEK_CACHE_MAX_MESSAGES: int = 1000       # Documents one cached DEK may encrypt
+    DEK_CACHE_MAX_BYTES: int = 100 * 1024 * 1024  # Plaintext bytes one cached DEK may encrypt
+
     # Qdrant Config
     QDRANT_HOST: str = "localhost"
     QDRANT_PORT: int = 6333
+    QDRANT_LOCATION: str = ""          # ":memory:" or a directory for Qdrant's embedded local mode (no server)
+    COLLECTION_REGISTRY_REFRESH_SECONDS: float = 30.0  # How stale /tenants may be across workers
+    # "collection": one collection per tenant (tenant_{id}).
+    # "shared": one collection for all tenants, filtered and HNSW-partitioned by tenant_id.
+    TENANCY_MODE: str = "collection"
+    SHARED_COLLECTION_NAME: str = "tenants_shared"
+
+    # Model Inference
+    INFERENCE_BACKEND: str = "torch"   # "torch" (fp32), "quantized" (int8 dynamic) or "onnx" (ONNX Runtime via optimum)
+    INFERENCE_MODEL_DIR: str = ""      # Where ONNX exports are cached; empty re-exports on every start
+    # Require safetensors weights (memory-mapped load, no pickle) for the pipelines and, with
+    # sentence-transformers>=2.3, the embedding model; older releases load it with a warning
+    INFERENCE_USE_SAFETENSORS: bool = False
+    # When services and models load:
+    #   "none":       lazily, on the first request that needs them
+    #   "background": on a background thread at startup (/ready reports progress)
+    #   "startup":    before the worker accepts requests
+    #   "import":     model weights when app.main is imported, i.e. in the master process
+    #                 before gunicorn --preload forks, so workers share them copy-on-write
+    PRELOAD_MODELS: str = "background"
+
+    # Retrieval & Context Building (per-request overrides: top_k, context_token_budget, rerank)
+    QUERY_TOP_K: int = 3                      # Hits fetched and decrypted per query
+    QUERY_MAX_TOP_K: int = 50
+    CONTEXT_TOKEN_BUDGET: int = 400           # LLM tokens for the context (capped by the model's 512 minus the prompt)
+    CONTEXT_DEDUP_THRESHOLD: float = 0.95     # Hits at least this similar to a better hit are dropped
+    CONTEXT_MIN_PASSAGE_TOKENS: int = 32      # Smallest truncated passage worth adding
+    CONTEXT_RERANK: bool = False              # Rerank hits with a cross-encoder before packing
+
+    # Semantic Answer Cache (per tenant, encrypted with the tenant's key; 0 entries disables it)
+    # A hit is only served while the tenant's Qdrant point count is unchanged, so an ingest
+    # through any worker invalidates every worker's answers. The count is read for would-be
+    # hits, and in the background (during generation) for answers about to be cached.
+    ANSWER_CACHE_MAX_ENTRIES: int = 256       # Per tenant
+    ANSWER_CACHE_MAX_TENANTS: int = 1000
+    ANSWER_CACHE_TTL_SECONDS: float = 600.0
+    ANSWER_CACHE_SIMILARITY: float = 0.97     # Min cosine similarity between query embeddings
+
+    # LLM Streaming (/query/stream)
+    LLM_STREAM_TIMEOUT_SECONDS: float = 60.0  # Max wait for the next piece of generated text
+
+    # Observability
+    METRICS_TENANT_LABELS: bool = True    # Label metrics by tenant ("all" when off)
+    METRICS_MAX_TENANTS: int = 200        # Tenants beyond this share the "other" label
+    TRACING_ENABLED: bool = False         # OpenTelemetry spans (needs opentelemetry-api); can be toggled at runtime
+    # /api/v1/debug/profiler and /debug/tracing (unauthenticated): enable only for profiling runs
+    PROFILER_ENDPOINTS_ENABLED: bool = False
+    PROFILER_MAX_DURATION_SECONDS: float = 300.0
+
+    # Document Chunking (ingest)
+    # Each chunk is encrypted, stored in S3 and embedded on its own, so queries
+    # fetch and decrypt only the matching passages.
+    CHUNK_MODE: str = "tokens"         # "tokens" (fixed windows), "sentences" (whole sentences / paragraphs) or "none"
+    CHUNK_MAX_TOKENS: int = 200        # all-MiniLM-L6-v2 truncates its input at 256 tokens
+    CHUNK_OVERLAP_TOKENS: int = 32     # Tokens repeated at the start of the next chunk
+
+    # PII Scrubbing
+    PII_CHUNK_TOKENS: int = 256        # NER window size (the model accepts at most 512 tokens)
+    PII_CHUNK_OVERLAP: int = 32        # Tokens shared by consecutive windows (< PII_CHUNK_TOKENS)
+    PII_NER_BATCH_SIZE: int = 16       # Windows per NER forward pass
+    PII_GAZETTEER_PATH: str = ""       # Optional JSON {"ORG": [...], "PER": [...]} of known sensitive terms
+
+    # Bulk Ingestion
+    INGEST_MAX_DOCUMENTS: int = 1000  # Per /ingest/batch request
+    INGEST_BATCH_SIZE: int = 32       # Documents per NER / embedding / upsert batch
+    INGEST_MAX_WORKERS: int = 8       # Concurrent KMS + S3 calls per batch
     
     # OpenAI (Optional for PoC, can use local embeddings)
     OPENAI_API_KEY: str = "sk-..."
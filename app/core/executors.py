@@ -0,0 +1,110 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from app.core.config import settings
+
+
+class ExecutorSaturated(Exception):
+    """
+    Raised when an executor already has as many tasks in flight as it may queue.
+    `executor` names the pool (or batcher) that shed the task; `stage` is set by
+    observe_stage to the innermost pipeline stage it was raised in, if any.
+    """
+    def __init__(self, message: str, executor: str = None):
+        super().__init__(message)
+        self.executor = executor
+        self.stage = None
+
+
+class BoundedExecutor:
+    """
+    Thread pool with a bounded backlog. Once max_workers + queue_size tasks are in
+    flight, submit() fails fast with ExecutorSaturated instead of letting the queue
+    (and tail latency) grow without limit.
+    """
+    def __init__(self, name: str, max_workers: int, queue_size: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.capacity = max_workers + queue_size
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        if not self._slots.acquire(blocking=False):
+            raise ExecutorSaturated(f"The '{self.name}' executor is at capacity ({self.capacity} tasks)", self.name)
+
+        # Counted before submitting: a fast task could otherwise finish (and decrement) first
+        with self._lock:
+            self._in_flight += 1
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except Exception:
+            self._release(None)
+            raise
+
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Runs fn on this executor and awaits the result without blocking the event loop.
+        """
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "capacity": self.capacity,
+            "in_flight": self._in_flight
+        }
+
+    def _release(self, _future: Future):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+
+# One executor per kind of work, so a slow LLM generation cannot starve
+# embedding or NER, and blocking network I/O never waits behind model inference.
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def _executor_workers(name: str) -> int:
+    return {
+        "ner": settings.NER_WORKERS,
+        "embedding": settings.EMBEDDING_WORKERS,
+        "llm": settings.LLM_WORKERS,
+        "anomaly": settings.ANOMALY_WORKERS,
+        "io": settings.IO_WORKERS,
+        "stream": settings.STREAM_WORKERS,
+    }[name]
+
+
+def get_executor(name: str) -> BoundedExecutor:
+    """
+    Returns the shared executor for one of: ner, embedding, llm, anomaly, io, stream.
+    """
+    with _executors_lock:
+        executor = _executors.get(name)
+        if executor is None:
+            executor = BoundedExecutor(name, _executor_workers(name), settings.EXECUTOR_QUEUE_SIZE)
+            _executors[name] = executor
+        return executor
+
+
+def executor_stats() -> dict:
+    with _executors_lock:
+        return {name: executor.stats() for name, executor in _executors.items()}
+
+
+def shutdown_executors():
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=False)
+        _executors.clear()
@@ -0,0 +1,230 @@
+import bisect
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from typing import Callable, Iterable, Optional
+from app.core.config import settings
+from app.core import tracing
+from app.core.executors import ExecutorSaturated
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans cache hits (sub-ms) up to cold LLM generations
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Counter:
+    """
+    Monotonic counter with labels, rendered in the Prometheus text format.
+    """
+    type = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> Iterable[tuple[str, dict, float]]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with labels, rendered in the Prometheus text format.
+    """
+    type = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # label values -> [count per bucket (+Inf last), sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self) -> Iterable[tuple[str, dict, float]]:
+        with self._lock:
+            series = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        for key, counts, total in series:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": _format_bound(bound)}, cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_duration_seconds",
+    "Time spent in one pipeline stage (PII scrub, KMS, S3, embedding, Qdrant, anomaly, LLM).",
+    ("stage", "tenant", "outcome")
+)
+REQUEST_SECONDS = Histogram(
+    "rag_request_duration_seconds",
+    "End-to-end API request time.",
+    ("endpoint", "tenant", "outcome")
+)
+REQUESTS = Counter(
+    "rag_requests_total",
+    "API requests by endpoint, tenant and outcome (success, error, rejected).",
+    ("endpoint", "tenant", "outcome")
+)
+
+STAGE_ERRORS = Counter(
+    "rag_stage_errors_total",
+    "Failed pipeline stages by stage, tenant and reason (error, saturated).",
+    ("stage", "tenant", "reason")
+)
+
+_metrics = [STAGE_SECONDS, REQUEST_SECONDS, REQUESTS, STAGE_ERRORS]
+# Callables returning (name, type, help, [(labels, value), ...]) for values read at scrape time
+_collectors: list[Callable[[], list]] = []
+
+_tenants = set()
+_tenants_lock = threading.Lock()
+
+
+def register_collector(collector: Callable[[], list]):
+    _collectors.append(collector)
+
+
+def tenant_label(tenant_id: Optional[str]) -> str:
+    """
+    Tenant label value. Bounded so a flood of tenant ids cannot blow up the
+    number of series: past METRICS_MAX_TENANTS, new tenants are reported as "other".
+    """
+    if not settings.METRICS_TENANT_LABELS:
+        return "all"
+    if tenant_id is None:
+        return "unknown"
+    with _tenants_lock:
+        if tenant_id in _tenants:
+            return tenant_id
+        if len(_tenants) < settings.METRICS_MAX_TENANTS:
+            _tenants.add(tenant_id)
+            return tenant_id
+    return "other"
+
+
+def count_stage_error(stage: str, tenant_id: Optional[str], reason: str = "error"):
+    STAGE_ERRORS.inc(stage=stage, tenant=tenant_label(tenant_id), reason=reason)
+
+
+def count_saturation(e: ExecutorSaturated, tenant_id: Optional[str]):
+    """
+    Counts load shed outside any observed stage (e.g. while submitting to an
+    executor), labeled with the executor's name. Saturation raised inside a stage
+    was already counted there.
+    """
+    if e.stage is None:
+        e.stage = e.executor or "unknown"
+        count_stage_error(e.stage, tenant_id, "saturated")
+
+
+@contextmanager
+def observe_stage(stage: str, tenant_id: Optional[str] = None):
+    """
+    Times the block into rag_stage_duration_seconds (outcome "error" if it raises)
+    and wraps it in a tracing span. A failure is also counted in rag_stage_errors_total;
+    saturation only in the innermost stage, so nested stages do not count it twice.
+    """
+    started = time.perf_counter()
+    outcome = "success"
+    try:
+        with tracing.span(stage, tenant_id=tenant_id):
+            yield
+    except ExecutorSaturated as e:
+        outcome = "error"
+        if e.stage is None:
+            e.stage = stage
+            count_stage_error(stage, tenant_id, "saturated")
+        raise
+    except Exception:
+        outcome = "error"
+        count_stage_error(stage, tenant_id, "error")
+        raise
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage, tenant=tenant_label(tenant_id), outcome=outcome)
+
+
+@contextmanager
+def observe_request(endpoint: str, tenant_id: Optional[str]):
+    """
+    Counts and times one API request. Load shedding (503) is reported as "rejected".
+    """
+    started = time.perf_counter()
+    outcome = "success"
+    try:
+        with tracing.span(f"request.{endpoint}", tenant_id=tenant_id):
+            yield
+    except BaseException as e:
+        outcome = "rejected" if getattr(e, "status_code", None) == 503 else "error"
+        raise
+    finally:
+        labels = {"endpoint": endpoint, "tenant": tenant_label(tenant_id), "outcome": outcome}
+        REQUEST_SECONDS.observe(time.perf_counter() - started, **labels)
+        REQUESTS.inc(**labels)
+
+
+def render_metrics() -> str:
+    """
+    All metrics in the Prometheus text exposition format (version 0.0.4).
+    """
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(_sample_line(name, labels, value) for name, labels, value in metric.samples())
+
+    for collector in _collectors:
+        try:
+            families = collector()
+        except Exception as e:
+            logger.warning(f"Metrics collector failed: {e}")
+            continue
+        for name, metric_type, help_text, samples in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.extend(_sample_line(name, labels, value) for labels, value in samples)
+    return "\n".join(lines) + "\n"
+
+
+def _sample_line(name: str, labels: dict, value: float) -> str:
+    if labels:
+        rendered = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+        return f"{name}{{{rendered}}} {value}"
+    return f"{name} {value}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(bound)
@@ -0,0 +1,103 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+
+class SamplingProfiler:
+    """
+    Low-overhead wall-clock profiler that can be started and stopped on a live
+    process. A background thread snapshots every thread's Python stack
+    (sys._current_frames) at a fixed interval and counts identical stacks.
+    The result is in the "collapsed stack" format used by flamegraph tools.
+    """
+    def __init__(self):
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._stacks = Counter()
+        self.samples = 0
+        self.interval_ms = None
+        self.started_at = None
+        self.stopped_at = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_ms: float, duration_seconds: Optional[float] = None):
+        """
+        Starts sampling (clearing the previous profile). It stops by itself after
+        duration_seconds, if given.
+        """
+        with self._lock:
+            if self.running:
+                raise RuntimeError("The profiler is already running")
+            self._stacks = Counter()
+            self.samples = 0
+            self.interval_ms = interval_ms
+            self.started_at = time.time()
+            self.stopped_at = None
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(interval_ms / 1000, duration_seconds), name="sampling-profiler", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def report(self, limit: int = 50) -> dict:
+        with self._lock:
+            top = self._stacks.most_common(limit)
+            samples = self.samples
+        return {
+            "running": self.running,
+            "interval_ms": self.interval_ms,
+            "started_at": self.started_at,
+            "stopped_at": self.stopped_at,
+            "samples": samples,
+            "stacks": [{"stack": stack, "count": count, "share": round(count / samples, 4) if samples else 0.0}
+                       for stack, count in top]
+        }
+
+    def collapsed(self) -> str:
+        """
+        One "frame;frame;frame count" line per distinct stack (root first),
+        e.g. for flamegraph.pl or speedscope.
+        """
+        with self._lock:
+            return "\n".join(f"{stack} {count}" for stack, count in self._stacks.most_common()) + "\n"
+
+    def _run(self, interval: float, duration_seconds: Optional[float]):
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + duration_seconds if duration_seconds else None
+        while not self._stop.wait(interval):
+            stacks = [
+                _collapse(frame)
+                for thread_id, frame in sys._current_frames().items()
+                if thread_id != own_id
+            ]
+            with self._lock:
+                self._stacks.update(stacks)
+                self.samples += 1
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+        self.stopped_at = time.time()
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+# Process-wide instance driven by the /debug/profiler endpoints
+profiler = SamplingProfiler()
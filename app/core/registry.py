@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import time
+import logging
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceRegistry:
+    """
+    Lazily constructed, process-wide service singletons.
+
+    A service is built by its factory on first access (registry.get(name) or
+    registry.<name>) and reused afterwards. Each service has its own lock, so
+    two threads asking for the same service build it once, while services that
+    depend on each other can still be built concurrently.
+    """
+    def __init__(self):
+        self._factories: dict[str, Callable[[], Any]] = {}
+        self._instances: dict[str, Any] = {}
+        self._locks: dict[str, threading.Lock] = {}
+        self._load_seconds: dict[str, float] = {}
+        self._errors: dict[str, str] = {}
+        self._preload_thread = None
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        self._factories[name] = factory
+        self._locks[name] = threading.Lock()
+
+    def get(self, name: str) -> Any:
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._locks[name]:
+            # Someone else may have built it while we waited for the lock
+            if name in self._instances:
+                return self._instances[name]
+
+            logger.info(f"Initializing {name}...")
+            started = time.perf_counter()
+            try:
+                instance = self._factories[name]()
+            except Exception as e:
+                # Not cached: the next access tries again
+                self._errors[name] = str(e)
+                raise
+            self._load_seconds[name] = time.perf_counter() - started
+            self._errors.pop(name, None)
+            self._instances[name] = instance
+            logger.info(f"{name} ready in {self._load_seconds[name]:.1f}s")
+            return instance
+
+    async def aget(self, name: str) -> Any:
+        """
+        get() for async handlers: a service that still has to load is built on a
+        worker thread, so the event loop keeps serving other requests meanwhile.
+        """
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        return await asyncio.get_running_loop().run_in_executor(None, self.get, name)
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_") or name not in self._factories:
+            raise AttributeError(name)
+        return self.get(name)
+
+    def peek(self, name: str) -> Any:
+        """
+        Returns the service if it is already built, None otherwise (never loads it).
+        """
+        return self._instances.get(name)
+
+    def is_ready(self) -> bool:
+        return all(name in self._instances for name in self._factories)
+
+    def status(self) -> dict:
+        return {
+            name: {
+                "loaded": name in self._instances,
+                "load_seconds": round(self._load_seconds[name], 2) if name in self._load_seconds else None,
+                "error": self._errors.get(name)
+            }
+            for name in self._factories
+        }
+
+    def preload(self, background: bool = False):
+        """
+        Builds every registered service, either now or on a daemon thread.
+        Failures are logged and left for the next access to retry.
+        """
+        if background:
+            self._preload_thread = threading.Thread(target=self.preload, name="service-preload", daemon=True)
+            self._preload_thread.start()
+            return
+
+        for name in self._factories:
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.warning(f"Could not preload {name}: {e}")
@@ -0,0 +1,35 @@
+import time
+from contextlib import contextmanager
+from app.core.metrics import observe_stage
+
+
+class StageTimer:
+    """
+    Wall-clock time spent in each named stage of one request.
+    A stage entered several times (e.g. once per ingest batch) accumulates.
+    Every stage is also recorded in the rag_stage_duration_seconds metric
+    (labeled with the tenant) and traced as a span.
+    """
+    def __init__(self, tenant_id: str = None):
+        self.tenant_id = tenant_id
+        self.seconds = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            with observe_stage(name, self.tenant_id):
+                yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - started
+
+    async def timed(self, name: str, awaitable):
+        """
+        Awaits awaitable inside stage(name); handy for stages that run concurrently
+        under asyncio.gather.
+        """
+        with self.stage(name):
+            return await awaitable
+
+    def as_ms(self) -> dict:
+        return {name: round(seconds * 1000, 2) for name, seconds in self.seconds.items()}
@@ -0,0 +1,50 @@
+import logging
+from contextlib import contextmanager
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Optional dependency: spans are only emitted when the OpenTelemetry API is installed.
+# Exporters / sampling are configured the standard OpenTelemetry way
+# (e.g. opentelemetry-instrument, OTEL_* environment variables).
+try:
+    from opentelemetry import trace as _otel_trace
+except ImportError:
+    _otel_trace = None
+
+_enabled = settings.TRACING_ENABLED
+
+
+def available() -> bool:
+    return _otel_trace is not None
+
+
+def is_enabled() -> bool:
+    return _enabled and _otel_trace is not None
+
+
+def set_enabled(enabled: bool):
+    """
+    Turns span creation on or off at runtime.
+    """
+    global _enabled
+    if enabled and _otel_trace is None:
+        raise RuntimeError("Tracing needs the OpenTelemetry API: pip install opentelemetry-api opentelemetry-sdk")
+    _enabled = enabled
+    logger.info(f"Tracing {'enabled' if enabled else 'disabled'}")
+
+
+@contextmanager
+def span(name: str, tenant_id: str = None):
+    """
+    A span named "rag.<name>" around the block, or nothing when tracing is off.
+    """
+    if not is_enabled():
+        yield
+        return
+
+    tracer = _otel_trace.get_tracer("secure-rag")
+    with tracer.start_as_current_span(f"rag.{name}") as current:
+        if tenant_id is not None:
+            current.set_attribute("rag.tenant_id", tenant_id)
+        yield
@@ -1,10 +1,39 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from app.core.config import settings
+from app.api import endpoints
 from app.api.endpoints import router as api_router
+from app.services.inference_backend import preload_models
+from app.core.metrics import render_metrics
 
-app = FastAPI(title="Secure RAG PoC", version="1.0.0")
+PRELOAD_MODES = ("none", "background", "startup", "import")
+if settings.PRELOAD_MODELS not in PRELOAD_MODES:
+    raise ValueError(f"PRELOAD_MODELS must be one of {PRELOAD_MODES}, got {settings.PRELOAD_MODELS!r}")
+
+if settings.PRELOAD_MODELS == "import":
+    # Runs once in the master process under `gunicorn --preload`; the forked
+    # workers inherit the loaded weights instead of each loading their own copy.
+    preload_models()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    endpoints.startup()
+    yield
+    endpoints.shutdown()
+
+app = FastAPI(title="Secure RAG PoC", version="1.0.0", lifespan=lifespan)
 
 app.include_router(api_router, prefix="/api/v1")
 
 @app.get("/")
 def read_root():
     return {"message": "Secure RAG System is Online"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    """
+    Prometheus scrape endpoint: per-stage and per-request latency histograms
+    (labeled by tenant and outcome), executor load and cache counters.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
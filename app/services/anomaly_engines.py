@@ -0,0 +1,157 @@
+from abc import ABC, abstractmethod
+from typing import NamedTuple, Optional
+from sklearn.ensemble import IsolationForest
+import numpy as np
+from app.core.config import settings
+
+
+class AnomalyEngine(ABC):
+    """
+    One tenant's anomaly model. score_samples returns one score per row:
+    > 0 means the row is anomalous, and higher is more anomalous.
+    Batch engines are refitted from history by the background trainer;
+    online engines (online = True) are updated per query with partial_fit.
+    """
+    online = False
+
+    @abstractmethod
+    def fit(self, X: np.ndarray):
+        ...
+
+    @abstractmethod
+    def partial_fit(self, X: np.ndarray):
+        ...
+
+    @abstractmethod
+    def score_samples(self, X: np.ndarray) -> np.ndarray:
+        ...
+
+
+class IsolationForestEngine(AnomalyEngine):
+    """
+    The original detector: a 100-tree Isolation Forest refitted on the tenant's history.
+    """
+    def __init__(self, model: IsolationForest = None):
+        self.model = model
+
+    def fit(self, X: np.ndarray):
+        # contamination='auto' or a small float (e.g., 0.05) for 5% expected anomalies
+        clf = IsolationForest(random_state=42, contamination=0.1)
+        clf.fit(X)
+        self.model = clf
+
+    def partial_fit(self, X: np.ndarray):
+        # Batch engine: new samples reach the model through the next fit() on the history
+        pass
+
+    def score_samples(self, X: np.ndarray) -> np.ndarray:
+        # decision_function < 0 is exactly where IsolationForest.predict() returns -1
+        return -self.model.decision_function(X)
+
+
+class CentroidStats(NamedTuple):
+    count: int = 0
+    mean: Optional[np.ndarray] = None
+    m2: Optional[np.ndarray] = None
+    # Exponentially weighted stats of observed distances
+    distance_count: int = 0
+    distance_mean: float = 0.0
+    distance_var: float = 0.0
+
+
+class CentroidEngine(AnomalyEngine):
+    """
+    Streaming detector: running per-dimension mean / variance of the tenant's query
+    embeddings (Welford), updated in O(d) per query with no refits.
+    A query's distance is its RMS z-score from the centroid. The engine also keeps
+    exponentially weighted stats of the distances it has seen (so the inflated
+    distances from its first few, poorly estimated samples fade out), and flags
+    queries further out than mean + sigmas * std of those distances. Until
+    warmup + 2 samples have been seen it returns NaN (no judgement).
+
+    All statistics live in one immutable CentroidStats that partial_fit replaces
+    in a single assignment, so score_samples (on another thread) never sees a new
+    count with an old M2. Calls to partial_fit must not run concurrently with each
+    other (AnomalyDetector makes them under its lock).
+    """
+    online = True
+
+    def __init__(self, sigmas: float = 3.0, distance_decay: float = 0.05, warmup: int = 20):
+        self.sigmas = sigmas
+        self.distance_decay = distance_decay
+        # Distances are only tracked once the centroid has seen this many samples
+        self.warmup = warmup
+        self.stats = CentroidStats()
+
+    def __setstate__(self, state: dict):
+        # Snapshots pickled before CentroidStats kept the statistics as attributes
+        if "stats" not in state:
+            state["stats"] = CentroidStats(*(state.pop(field) for field in CentroidStats._fields))
+        self.__dict__.update(state)
+
+    def fit(self, X: np.ndarray):
+        X = np.asarray(X, dtype=np.float64)
+        stats = CentroidStats(count=len(X), mean=X.mean(axis=0), m2=X.var(axis=0) * len(X))
+        distances = self._distances(stats, X)
+        self.stats = stats._replace(
+            distance_count=len(distances),
+            distance_mean=float(distances.mean()),
+            distance_var=float(distances.var())
+        )
+
+    def partial_fit(self, X: np.ndarray):
+        stats = self.stats
+        for x in np.asarray(X, dtype=np.float64).reshape(-1, np.shape(X)[-1]):
+            if stats.count >= self.warmup:
+                # Score the new point against the model before it learns from it
+                stats = self._with_distance(stats, float(self._distances(stats, x.reshape(1, -1))[0]))
+
+            count = stats.count + 1
+            if stats.mean is None:
+                stats = stats._replace(count=count, mean=x.copy(), m2=np.zeros_like(x))
+                continue
+            delta = x - stats.mean
+            mean = stats.mean + delta / count
+            stats = stats._replace(count=count, mean=mean, m2=stats.m2 + delta * (x - mean))
+        self.stats = stats
+
+    def score_samples(self, X: np.ndarray) -> np.ndarray:
+        stats = self.stats
+        distances = self._distances(stats, np.asarray(X, dtype=np.float64))
+        if stats.distance_count < 2:
+            return np.full(len(distances), np.nan)
+        threshold = stats.distance_mean + self.sigmas * np.sqrt(stats.distance_var)
+        return distances / threshold - 1.0
+
+    @staticmethod
+    def _distances(stats: CentroidStats, X: np.ndarray) -> np.ndarray:
+        variance = stats.m2 / max(stats.count - 1, 1)
+        return np.sqrt(np.mean((X - stats.mean) ** 2 / (variance + 1e-6), axis=1))
+
+    def _with_distance(self, stats: CentroidStats, distance: float) -> CentroidStats:
+        distance_count = stats.distance_count + 1
+        # Plain running mean at first, then an exponential moving average
+        weight = max(1.0 / distance_count, self.distance_decay)
+        delta = distance - stats.distance_mean
+        return stats._replace(
+            distance_count=distance_count,
+            distance_mean=stats.distance_mean + weight * delta,
+            distance_var=(1 - weight) * (stats.distance_var + weight * delta * delta)
+        )
+
+
+ENGINES = {
+    "isolation_forest": IsolationForestEngine,
+    "centroid": CentroidEngine,
+}
+
+
+def build_engine(name: str) -> AnomalyEngine:
+    """
+    Returns a fresh engine of the given type (see ENGINES / ANOMALY_ENGINE).
+    """
+    if name not in ENGINES:
+        raise ValueError(f"Unknown anomaly engine {name!r}, expected one of {sorted(ENGINES)}")
+    if name == "centroid":
+        return CentroidEngine(sigmas=settings.ANOMALY_CENTROID_SIGMAS)
+    return ENGINES[name]()
@@ -0,0 +1,112 @@
+import hashlib
+import logging
+import os
+import shutil
+import socket
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+WORKER_DIR_PREFIX = "worker-"
+
+
+def worker_directory(directory: str) -> str:
+    """
+    Creates and returns this process's own subdirectory of directory, so workers
+    sharing ANOMALY_HISTORY_DIR never write each other's files. Subdirectories left
+    by processes of this host that are no longer running are removed. Nothing is
+    restored from them: after a restart, history comes back from the anomaly snapshots.
+    """
+    prefix = f"{WORKER_DIR_PREFIX}{socket.gethostname()}-"
+    os.makedirs(directory, exist_ok=True)
+    for entry in os.listdir(directory):
+        if not entry.startswith(prefix) or not entry[len(prefix):].isdigit():
+            continue
+        if not _process_alive(int(entry[len(prefix):])):
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+            logger.info(f"Removed stale anomaly history directory {entry}")
+
+    path = os.path.join(directory, f"{prefix}{os.getpid()}")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _process_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, but belongs to another user
+        return True
+    return True
+
+
+class EmbeddingRingBuffer:
+    """
+    Fixed-capacity ring buffer of query embeddings backed by one preallocated
+    float32 array (4 bytes per dimension instead of a list of Python floats).
+    With a directory set, the array is a memory-mapped file, so history is paged
+    from disk instead of pinned in RAM. The directory must belong to this process
+    (see worker_directory): the file is created empty.
+    """
+    def __init__(self, capacity: int, dim: int, directory: str = None, name: str = None):
+        self.capacity = capacity
+        self.dim = dim
+        self.path = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            # Hash the tenant ID so arbitrary IDs map to safe file names
+            file_name = hashlib.sha256((name or "").encode()).hexdigest()[:32] + ".f32"
+            self.path = os.path.join(directory, file_name)
+            self._data = np.memmap(self.path, dtype=np.float32, mode="w+", shape=(capacity, dim))
+        else:
+            self._data = np.zeros((capacity, dim), dtype=np.float32)
+        self._next = 0
+        self._count = 0
+
+    def append(self, embedding):
+        self._data[self._next] = embedding
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def load(self, embeddings: np.ndarray):
+        """
+        Replaces the contents with the given rows (keeping the most recent ones if
+        there are more than fit).
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)[-self.capacity:]
+        count = len(embeddings)
+        self._data[:count] = embeddings
+        self._count = count
+        self._next = count % self.capacity
+
+    def view(self) -> np.ndarray:
+        """
+        Zero-copy view of the stored embeddings. Once the buffer has wrapped, rows
+        are not in arrival order; that does not matter for fitting a detector.
+        Rows may be overwritten by later appends while a caller still holds the view,
+        so copy it (under the owner's lock) before using it outside that lock.
+        """
+        return self._data[:self._count]
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes
+
+    def footprint(self) -> dict:
+        return {
+            "samples": self._count,
+            "capacity": self.capacity,
+            "bytes": self.nbytes,
+            "storage": "mmap" if self.path else "memory"
+        }
+
+    def close(self):
+        if isinstance(self._data, np.memmap):
+            self._data.flush()
@@ -1,58 +1,372 @@
 from sklearn.ensemble import IsolationForest
 import numpy as np
 from collections import defaultdict
+import threading
+import time
+import shutil
 import logging
+from app.core.config import settings
+from app.services.anomaly_history import EmbeddingRingBuffer, worker_directory
+from app.services.anomaly_engines import ENGINES, IsolationForestEngine, build_engine
+from app.core.batching import MicroBatcher
+from app.core.executors import get_executor, ExecutorSaturated
+from app.core.metrics import observe_stage
 
 logger = logging.getLogger(__name__)
 
 class AnomalyDetector:
-    def __init__(self):
-        # Dictionary to store one Isolation Forest model per tenant
+    def __init__(self, store=None):
+        # Detector engine selected per deployment (ANOMALY_ENGINE): "isolation_forest"
+        # is refitted in the background, "centroid" is updated online per query.
+        if settings.ANOMALY_ENGINE not in ENGINES:
+            raise ValueError(f"Unknown ANOMALY_ENGINE {settings.ANOMALY_ENGINE!r}, expected one of {sorted(ENGINES)}")
+        self.engine_name = settings.ANOMALY_ENGINE
+        self.online = ENGINES[self.engine_name].online
+        # Dictionary to store one detector engine per tenant.
+        # Batch-trained models are only ever replaced as a whole, so readers never see a half-trained one.
         self.models = {} 
-        # History of query embeddings per tenant to train the models
-        self.history = defaultdict(list) 
+        # Ring buffer of recent query embeddings per tenant to train the models
+        self.history = {}
+        # Memory-mapped history files live in a directory of this worker only
+        self.history_dir = worker_directory(settings.ANOMALY_HISTORY_DIR) if settings.ANOMALY_HISTORY_DIR else None
         # Minimum samples required before we start flagging anomalies
-        self.min_samples_to_train = 5
+        self.min_samples_to_train = settings.ANOMALY_MIN_SAMPLES
+        # Retrain after this many new samples, or after this many seconds if anything changed
+        self.retrain_every = settings.ANOMALY_RETRAIN_EVERY
+        self.retrain_interval = settings.ANOMALY_RETRAIN_INTERVAL_SECONDS
+
+        # Optional AnomalySnapshotStore: models + history are snapshotted on a schedule,
+        # loaded in the background after a tenant's first request and refreshed when a newer version appears.
+        self.store = store
+        self.versions = {}
+        self._dirty = set()
+        self._loaded = set()
+        self._last_snapshot = time.monotonic()
+        self._last_refresh = time.monotonic()
+
+        self._online_engines = {}
+        self._new_samples = defaultdict(int)
+        self._last_trained = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._trainer = threading.Thread(target=self._run_trainer, name="anomaly-trainer", daemon=True)
+        self._trainer.start()
+
+        # Concurrent query checks are logged and scored together in one vectorized call
+        self.batcher = None
+        if settings.ANOMALY_BATCHING_ENABLED:
+            self.batcher = MicroBatcher(
+                "anomaly",
+                self._log_and_score_items,
+                max_batch_size=settings.ANOMALY_BATCH_MAX_SIZE,
+                max_wait_ms=settings.ANOMALY_BATCH_MAX_WAIT_MS,
+                max_queue_size=settings.EXECUTOR_QUEUE_SIZE
+            )
 
     def log_query(self, tenant_id: str, embedding: list[float]):
         """
-        Logs a query embedding for a tenant and retrains the model if enough data is collected.
+        Logs a query embedding for a tenant. Training happens on the background
+        trainer thread; this only wakes it up when a retrain is due.
+        """
+        self._ensure_loaded(tenant_id)
+        with self._lock:
+            history = self._history_for(tenant_id, len(embedding))
+            history.append(embedding)
+            self._new_samples[tenant_id] += 1
+            if self.online:
+                self._update_online(tenant_id, embedding, len(history))
+            due = self._retrain_due(tenant_id, time.monotonic())
+
+        if due:
+            self._wakeup.set()
+
+    def footprint(self) -> dict:
+        """
+        Memory / disk used by each tenant's history buffer.
+        """
+        with self._lock:
+            return {tenant_id: history.footprint() for tenant_id, history in self.history.items()}
+
+    def batcher_stats(self) -> dict:
+        return self.batcher.stats() if self.batcher else {}
+
+    def close(self):
+        if self.batcher:
+            self.batcher.close()
+        self._stopped = True
+        self._wakeup.set()
+        self._trainer.join(timeout=5)
+        self._save_snapshots()
+        for history in self.history.values():
+            history.close()
+        if self.history_dir:
+            # History is not read back after a restart (snapshots are), so the files can go
+            shutil.rmtree(self.history_dir, ignore_errors=True)
+
+    def _update_online(self, tenant_id: str, embedding: list[float], samples: int):
+        # Caller must hold self._lock. O(d) update, no refit.
+        engine = self._online_engines.get(tenant_id)
+        if engine is None:
+            engine = build_engine(self.engine_name)
+            self._online_engines[tenant_id] = engine
+        engine.partial_fit(np.asarray(embedding, dtype=np.float32).reshape(1, -1))
+        self._new_samples[tenant_id] = 0
+
+        if samples >= self.min_samples_to_train:
+            self.models[tenant_id] = engine
+            self.versions[tenant_id] = int(time.time() * 1000)
+            self._dirty.add(tenant_id)
+
+    def _history_for(self, tenant_id: str, dim: int) -> EmbeddingRingBuffer:
+        # Caller must hold self._lock
+        history = self.history.get(tenant_id)
+        if history is None:
+            history = EmbeddingRingBuffer(
+                settings.ANOMALY_HISTORY_SIZE,
+                dim,
+                directory=self.history_dir,
+                name=tenant_id
+            )
+            self.history[tenant_id] = history
+        return history
+
+    def _ensure_loaded(self, tenant_id: str):
+        """
+        On the first request for a tenant, starts restoring its latest snapshot (if any)
+        on the io executor, so a fresh worker does not fail open until history builds up
+        again. Never blocks the caller (the anomaly micro-batcher): the tenant scores NaN
+        ("no model") until the load has finished.
+        """
+        if self.store is None or tenant_id in self._loaded:
+            return
+        with self._lock:
+            if tenant_id in self._loaded:
+                return
+            self._loaded.add(tenant_id)
+        try:
+            get_executor("io").submit(self._load_snapshot, tenant_id)
+        except ExecutorSaturated:
+            # Retried on the tenant's next request
+            with self._lock:
+                self._loaded.discard(tenant_id)
+
+    def _load_snapshot(self, tenant_id: str):
+        try:
+            version = self.store.latest_version(tenant_id)
+            snapshot = self.store.load(tenant_id, version) if version else None
+        except Exception as e:
+            logger.warning(f"Could not load anomaly snapshot for {tenant_id}: {e}")
+            return
+        if snapshot is None:
+            return
+
+        with self._lock:
+            if version <= self.versions.get(tenant_id, 0):
+                return
+            history = self._history_for(tenant_id, snapshot["history"].shape[1])
+            # Keep the queries logged while the snapshot was loading
+            history.load(np.concatenate([snapshot["history"], history.view()]))
+            engine = self._restore_engine(snapshot["model"], history)
+            if engine is None:
+                return
+            self.models[tenant_id] = engine
+            if self.online:
+                self._online_engines[tenant_id] = engine
+            self.versions[tenant_id] = version
+            self._last_trained[tenant_id] = time.monotonic()
+        logger.info(f"Loaded anomaly model v{version} for tenant {tenant_id}.")
+
+    def _restore_engine(self, model, history: EmbeddingRingBuffer):
+        """
+        Adapts a snapshotted model to the configured engine. Older snapshots hold a
+        bare IsolationForest; a snapshot from a different engine is rebuilt from
+        the restored history instead.
+        """
+        if isinstance(model, IsolationForest):
+            model = IsolationForestEngine(model)
+        if isinstance(model, ENGINES[self.engine_name]):
+            return model
+
+        if history is None or len(history) < self.min_samples_to_train:
+            return None
+        engine = build_engine(self.engine_name)
+        engine.fit(history.view())
+        return engine
+
+    def _save_snapshots(self):
+        if self.store is None:
+            return
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            snapshots = {
+                tenant_id: {
+                    "version": self.versions[tenant_id],
+                    "model": self.models[tenant_id],
+                    "history": self.history[tenant_id].view().copy()
+                }
+                for tenant_id in dirty
+            }
+
+        for tenant_id, snapshot in snapshots.items():
+            try:
+                self.store.save(tenant_id, snapshot["version"], snapshot)
+            except Exception as e:
+                logger.error(f"Failed to snapshot anomaly model for {tenant_id}: {e}")
+                with self._lock:
+                    self._dirty.add(tenant_id)
+
+    def _refresh_models(self):
+        """
+        Picks up models that other workers trained and snapshotted after ours.
+        Only the model is swapped; the local history is kept.
         """
-        self.history[tenant_id].append(embedding)
-        
-        # In a real system, training would be async/background job.
-        # For PoC, we check and train inline if we hit the threshold or periodically.
-        # Here we retrain every time we get a new batch of data (simplified).
-        if len(self.history[tenant_id]) >= self.min_samples_to_train:
-            self._train_model(tenant_id)
+        if self.store is None or self.online:
+            # Online engines keep learning locally; replacing them would drop those updates
+            return
+        for tenant_id in list(self._loaded):
+            try:
+                version = self.store.latest_version(tenant_id)
+                if not version or version <= self.versions.get(tenant_id, 0):
+                    continue
+                snapshot = self.store.load(tenant_id, version)
+            except Exception as e:
+                logger.warning(f"Could not refresh anomaly model for {tenant_id}: {e}")
+                continue
+            engine = self._restore_engine(snapshot["model"], self.history.get(tenant_id)) if snapshot else None
+            if engine is None:
+                continue
+            with self._lock:
+                # A local retrain may have finished since the version check above
+                if version <= self.versions.get(tenant_id, 0):
+                    continue
+                self.models[tenant_id] = engine
+                self.versions[tenant_id] = version
+            logger.info(f"Refreshed anomaly model for tenant {tenant_id} to v{version}.")
+
+    def _retrain_due(self, tenant_id: str, now: float) -> bool:
+        # Caller must hold self._lock
+        if self.online:
+            return False
+        if len(self.history[tenant_id]) < self.min_samples_to_train or not self._new_samples[tenant_id]:
+            return False
+        if tenant_id not in self.models:
+            # First model for this tenant: train as soon as we have enough samples
+            return True
+        return (
+            self._new_samples[tenant_id] >= self.retrain_every
+            or now - self._last_trained.get(tenant_id, 0.0) >= self.retrain_interval
+        )
+
+    def _run_trainer(self):
+        tick = min(
+            self.retrain_interval,
+            settings.ANOMALY_SNAPSHOT_INTERVAL_SECONDS,
+            settings.ANOMALY_MODEL_REFRESH_SECONDS
+        )
+        while not self._stopped:
+            # Wake up when log_query says a retrain is due, or periodically for the time-based rules
+            self._wakeup.wait(timeout=tick)
+            self._wakeup.clear()
+            if self._stopped:
+                return
+
+            now = time.monotonic()
+            with self._lock:
+                due = [tenant_id for tenant_id in list(self.history) if self._retrain_due(tenant_id, now)]
+            for tenant_id in due:
+                self._train_model(tenant_id)
+
+            now = time.monotonic()
+            if now - self._last_snapshot >= settings.ANOMALY_SNAPSHOT_INTERVAL_SECONDS:
+                self._last_snapshot = now
+                self._save_snapshots()
+            if now - self._last_refresh >= settings.ANOMALY_MODEL_REFRESH_SECONDS:
+                self._last_refresh = now
+                self._refresh_models()
 
     def _train_model(self, tenant_id: str):
         try:
-            data = np.array(self.history[tenant_id])
-            # contamination='auto' or a small float (e.g., 0.05) for 5% expected anomalies
-            clf = IsolationForest(random_state=42, contamination=0.1) 
-            clf.fit(data)
-            self.models[tenant_id] = clf
-            logger.info(f"Updated Anomaly Detection model for tenant {tenant_id}")
-            print(f"DEBUG: Trained anomaly model for {tenant_id} with {len(data)} samples.")
+            with self._lock:
+                # Copied under the lock: appends keep overwriting the ring buffer while the model fits.
+                # float32 rows, so IsolationForest does not convert them again.
+                data = self.history[tenant_id].view().copy()
+                self._new_samples[tenant_id] = 0
+                self._last_trained[tenant_id] = time.monotonic()
+
+            engine = build_engine(self.engine_name)
+            with observe_stage("anomaly_train", tenant_id):
+                engine.fit(data)
+            # Atomic swap: is_anomalous keeps using the previous model until this point
+            with self._lock:
+                self.models[tenant_id] = engine
+                # Wall-clock milliseconds, so versions from different workers are comparable
+                self.versions[tenant_id] = int(time.time() * 1000)
+                self._dirty.add(tenant_id)
+            logger.info(f"Updated Anomaly Detection model for tenant {tenant_id} with {len(data)} samples.")
         except Exception as e:
             logger.error(f"Failed to train anomaly model for {tenant_id}: {e}")
 
     def is_anomalous(self, tenant_id: str, embedding: list[float]) -> bool:
         """
         Returns True if the query is statistically anomalous for this tenant.
+        Never waits for training: it scores against the latest finished model.
         """
-        if tenant_id not in self.models:
-            # Not enough data yet to judge. Fail open (allow).
-            return False
-            
-        # Reshape for single sample prediction
-        prediction = self.models[tenant_id].predict([embedding])
-        
-        # IsolationForest returns -1 for anomaly, 1 for normal
-        is_anomaly = prediction[0] == -1
-        
-        if is_anomaly:
-            logger.warning(f"Anomaly detected for tenant {tenant_id}!")
-            
-        return is_anomaly
+        return self.is_anomalous_batch([tenant_id], [embedding])[0]
+
+    def is_anomalous_batch(self, tenant_ids, embeddings) -> list[bool]:
+        """
+        Batched is_anomalous. Tenants without a model yet are never flagged (fail open).
+        """
+        scores = self.score_batch(tenant_ids, embeddings)
+        # NaN (no model) compares False, so it is never flagged
+        flags = [bool(score > 0) for score in scores]
+        for tenant_id, flagged in zip(self._broadcast(tenant_ids, len(flags)), flags):
+            if flagged:
+                logger.warning(f"Anomaly detected for tenant {tenant_id}!")
+        return flags
+
+    def score_batch(self, tenant_ids, embeddings) -> np.ndarray:
+        """
+        Continuous anomaly scores for many embeddings in one vectorized call per tenant.
+        tenant_ids is either one tenant ID for all rows or one ID per row.
+        Scores come from the tenant's engine: > 0 means the model flags the row,
+        and higher is more anomalous. Rows whose tenant has no model yet score NaN.
+        """
+        X = np.asarray(embeddings, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        tenant_ids = self._broadcast(tenant_ids, len(X))
+        scores = np.full(len(X), np.nan)
+
+        rows_by_tenant = defaultdict(list)
+        for row, tenant_id in enumerate(tenant_ids):
+            rows_by_tenant[tenant_id].append(row)
+
+        for tenant_id, rows in rows_by_tenant.items():
+            self._ensure_loaded(tenant_id)
+            engine = self.models.get(tenant_id)
+            if engine is None:
+                # Not enough data yet to judge. Fail open (allow).
+                continue
+            scores[rows] = engine.score_samples(X[rows])
+        return scores
+
+    def log_and_score(self, tenant_ids, embeddings) -> np.ndarray:
+        """
+        Logs every embedding (see log_query) and returns score_batch for the same rows.
+        """
+        tenant_ids = self._broadcast(tenant_ids, len(embeddings))
+        for tenant_id, embedding in zip(tenant_ids, embeddings):
+            self.log_query(tenant_id, embedding)
+        return self.score_batch(tenant_ids, embeddings)
+
+    def _log_and_score_items(self, items: list[tuple[str, list[float]]]) -> list[float]:
+        # MicroBatcher entry point: items are (tenant_id, embedding) pairs
+        tenant_ids = [tenant_id for tenant_id, _ in items]
+        return self.log_and_score(tenant_ids, [embedding for _, embedding in items]).tolist()
+
+    def _broadcast(self, tenant_ids, count: int) -> list[str]:
+        if isinstance(tenant_ids, str):
+            return [tenant_ids] * count
+        return list(tenant_ids)
@@ -0,0 +1,98 @@
+import os
+from abc import ABC, abstractmethod
+import pickle
+import hashlib
+import logging
+from typing import Callable, Optional
+from botocore.exceptions import ClientError
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class AnomalySnapshotStore(ABC):
+    """
+    Versioned storage for anomaly detector snapshots (model + bounded history).
+    Each save writes an immutable versioned object and then moves a small
+    "latest" pointer, so readers always see a complete snapshot.
+    Snapshots are pickles: only point this at storage the service itself controls.
+    """
+    def save(self, tenant_id: str, version: int, snapshot: dict):
+        self._write(self._key(tenant_id, f"v{version}.pkl"), pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL))
+        self._write(self._key(tenant_id, "latest"), str(version).encode())
+
+    def latest_version(self, tenant_id: str) -> Optional[int]:
+        data = self._read(self._key(tenant_id, "latest"))
+        return int(data) if data else None
+
+    def load(self, tenant_id: str, version: int) -> Optional[dict]:
+        data = self._read(self._key(tenant_id, f"v{version}.pkl"))
+        return pickle.loads(data) if data else None
+
+    def _key(self, tenant_id: str, name: str) -> str:
+        # Hash the tenant ID so arbitrary IDs map to safe paths / keys
+        return f"{hashlib.sha256(tenant_id.encode()).hexdigest()[:32]}/{name}"
+
+    @abstractmethod
+    def _write(self, key: str, data: bytes):
+        ...
+
+    @abstractmethod
+    def _read(self, key: str) -> Optional[bytes]:
+        """
+        Returns the stored bytes, or None if the key does not exist.
+        """
+
+
+class LocalSnapshotStore(AnomalySnapshotStore):
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _write(self, key: str, data: bytes):
+        path = os.path.join(self.directory, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file and rename, so a crash never leaves a torn snapshot
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _read(self, key: str) -> Optional[bytes]:
+        try:
+            with open(os.path.join(self.directory, key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+class S3SnapshotStore(AnomalySnapshotStore):
+    def __init__(self, storage_service, prefix: str = "_system/anomaly"):
+        self.storage = storage_service
+        self.prefix = prefix
+
+    def _write(self, key: str, data: bytes):
+        self.storage.upload_file(f"{self.prefix}/{key}", data)
+
+    def _read(self, key: str) -> Optional[bytes]:
+        try:
+            return self.storage.download_file(f"{self.prefix}/{key}")
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return None
+            raise
+
+
+def build_snapshot_store(get_storage_service: Callable[[], object]) -> Optional[AnomalySnapshotStore]:
+    """
+    Returns the store selected by ANOMALY_SNAPSHOT_BACKEND ("none", "local" or "s3").
+    get_storage_service is only called for "s3", so the other backends never
+    build a StorageService (and its S3 / KMS clients).
+    """
+    backend = settings.ANOMALY_SNAPSHOT_BACKEND
+    if backend == "none":
+        return None
+    if backend == "local":
+        return LocalSnapshotStore(settings.ANOMALY_SNAPSHOT_DIR)
+    if backend == "s3":
+        return S3SnapshotStore(get_storage_service())
+    raise ValueError(f"Unknown ANOMALY_SNAPSHOT_BACKEND: {backend!r}")
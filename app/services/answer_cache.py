@@ -0,0 +1,213 @@
+from collections import OrderedDict
+import numpy as np
+import json
+import threading
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerCache:
+    """
+    Per-tenant semantic cache of generated answers.
+
+    A query whose embedding has cosine similarity >= ANSWER_CACHE_SIMILARITY with a
+    cached query of the same tenant (asked with the same retrieval options) gets the
+    cached answer, skipping search, S3, KMS and the LLM.
+
+    - Isolation: entries live in one bucket per tenant, only that tenant's bucket is
+      searched, and each entry is encrypted with a DEK of that tenant's KMS key.
+    - Encryption at rest: answers and documents are only kept as ciphertext;
+      the query vectors used for matching are the only plaintext.
+    - Freshness: every entry records the tenant's freshness token (freshness(tenant_id),
+      e.g. its Qdrant point count) from before the answer was computed, and a hit is
+      only served while the token is unchanged. The token lives outside the process,
+      so an ingest handled by another worker invalidates this worker's entries too.
+      It is only read for a would-be hit, and for answers about to be stored.
+      Locally, ingesting into a tenant also drops its entries and bumps its generation,
+      so an answer computed before the ingest is never stored after it.
+      Entries expire after ANSWER_CACHE_TTL_SECONDS.
+    - Bounded: LRU per tenant (ANSWER_CACHE_MAX_ENTRIES) and across tenants (ANSWER_CACHE_MAX_TENANTS).
+    """
+    def __init__(self, encryption_service, max_entries: int, max_tenants: int,
+                 ttl_seconds: float, similarity: float, freshness=None):
+        self.encryption_service = encryption_service
+        # tenant_id -> token that changes whenever the tenant's documents change
+        self.freshness = freshness
+        self.max_entries = max_entries
+        self.max_tenants = max_tenants
+        self.ttl_seconds = ttl_seconds
+        self.similarity = similarity
+        # tenant_id -> OrderedDict(entry_id -> entry), least recently used first
+        self._tenants = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, tenant_id: str, query_vector: list[float], options: tuple) -> tuple[dict, tuple]:
+        """
+        Returns (cached response or None, stamp). Pass the stamp back to put(): it
+        holds the tenant's generation and, when this lookup had to read it, the
+        freshness token (otherwise None: see read_freshness). The token is only read
+        once a cached query passes the similarity threshold, so misses cost no extra call.
+        """
+        vector = _normalize(query_vector)
+        now = time.monotonic()
+        with self._lock:
+            generation = self._generations.get(tenant_id, 0)
+            entries = self._tenants.get(tenant_id)
+            best_id, best_similarity = None, -1.0
+            if entries:
+                for entry_id in [k for k, e in entries.items() if e["expires_at"] <= now]:
+                    del entries[entry_id]
+                    self.evictions += 1
+                candidates = [(k, e) for k, e in entries.items() if e["options"] == options]
+                if candidates:
+                    similarities = np.stack([e["vector"] for _, e in candidates]) @ vector
+                    best = int(np.argmax(similarities))
+                    best_id, best_similarity = candidates[best][0], float(similarities[best])
+
+            if best_id is None or best_similarity < self.similarity:
+                self.misses += 1
+                return None, (generation, None)
+            entry = entries[best_id]
+
+        freshness = self.read_freshness(tenant_id)
+        stamp = (generation, freshness)
+        if self.freshness and (freshness is None or entry["freshness"] != freshness):
+            # Documents changed since the answer was computed (possibly via another worker)
+            self._drop_stale(tenant_id, freshness)
+            with self._lock:
+                self.misses += 1
+            return None, stamp
+
+        with self._lock:
+            entries = self._tenants.get(tenant_id)
+            if entries and best_id in entries:
+                entries.move_to_end(best_id)
+                self._tenants.move_to_end(tenant_id)
+
+        try:
+            response = json.loads(self.encryption_service.decrypt_text(entry["ciphertext"], entry["encrypted_dek"], tenant_id))
+        except Exception as e:
+            logger.warning(f"Dropping undecryptable answer cache entry for {tenant_id}: {e}")
+            self._drop(tenant_id, best_id)
+            with self._lock:
+                self.misses += 1
+            return None, stamp
+
+        if response.pop("tenant_id", None) != tenant_id:
+            # Never serve another tenant's answer, whatever went wrong
+            self._drop(tenant_id, best_id)
+            with self._lock:
+                self.misses += 1
+            return None, stamp
+
+        with self._lock:
+            self.hits += 1
+        response["cache_similarity"] = round(best_similarity, 4)
+        return response, stamp
+
+    def read_freshness(self, tenant_id: str):
+        """
+        The tenant's current freshness token, or None if it cannot be read (a hit is
+        then not served and nothing is stored). Read it before computing an answer
+        that will be put(), so an ingest during the computation makes the entry stale.
+        """
+        if not self.freshness:
+            return None
+        try:
+            return self.freshness(tenant_id)
+        except Exception as e:
+            logger.warning(f"Could not read answer cache freshness for {tenant_id}: {e}")
+            return None
+
+    def put(self, tenant_id: str, query_vector: list[float], options: tuple, response: dict, stamp: tuple):
+        """
+        Encrypts and stores a response. stamp is (generation from get(), freshness token
+        read before the response was computed). Skipped if the tenant ingested documents
+        through this worker since get() (its generation moved on) or without a token.
+        """
+        generation, freshness = stamp
+        if self.freshness and freshness is None:
+            return
+        try:
+            encrypted = self.encryption_service.encrypt_text(tenant_id, json.dumps({**response, "tenant_id": tenant_id}))
+        except Exception as e:
+            logger.warning(f"Could not cache answer for {tenant_id}: {e}")
+            return
+
+        entry = {
+            "vector": _normalize(query_vector),
+            "options": options,
+            "freshness": freshness,
+            "ciphertext": encrypted["ciphertext"],
+            "encrypted_dek": encrypted["encrypted_dek"],
+            "expires_at": time.monotonic() + self.ttl_seconds
+        }
+        with self._lock:
+            if self._generations.get(tenant_id, 0) != generation:
+                return
+            entries = self._tenants.setdefault(tenant_id, OrderedDict())
+            entries[uuid.uuid4().hex] = entry
+            self._tenants.move_to_end(tenant_id)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+                self.evictions += 1
+            while len(self._tenants) > self.max_tenants:
+                _, evicted = self._tenants.popitem(last=False)
+                self.evictions += len(evicted)
+
+    def invalidate(self, tenant_id: str):
+        """
+        Called after documents are ingested into the tenant: its cached answers may be stale.
+        """
+        with self._lock:
+            self._generations[tenant_id] = self._generations.get(tenant_id, 0) + 1
+            if self._tenants.pop(tenant_id, None):
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        with self._lock:
+            size = sum(len(entries) for entries in self._tenants.values())
+        return {
+            "tenants": len(self._tenants),
+            "size": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def _drop_stale(self, tenant_id: str, freshness):
+        with self._lock:
+            entries = self._tenants.get(tenant_id)
+            if not entries:
+                return
+            stale = [k for k, e in entries.items() if freshness is None or e["freshness"] != freshness]
+            for entry_id in stale:
+                del entries[entry_id]
+            if stale:
+                self.invalidations += 1
+
+    def _drop(self, tenant_id: str, entry_id: str):
+        with self._lock:
+            entries = self._tenants.get(tenant_id)
+            if entries:
+                entries.pop(entry_id, None)
+
+
+def _normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / (np.linalg.norm(vector) or 1.0)
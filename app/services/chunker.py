@@ -0,0 +1,100 @@
+import bisect
+import re
+
+CHUNK_MODES = ("none", "tokens", "sentences")
+# Sentence ends (".", "!" or "?" followed by whitespace) and paragraph breaks
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+
+class Chunker:
+    """
+    Splits a document into passages that fit the embedding model, so every part of
+    a long document gets its own vector instead of being truncated away.
+    - "tokens":    fixed windows of max_tokens, consecutive windows sharing overlap_tokens
+    - "sentences": whole sentences / paragraphs packed up to max_tokens; the next chunk
+                   repeats the trailing sentences that fit in overlap_tokens. A sentence
+                   longer than max_tokens falls back to token windows.
+    - "none":      the whole document is one chunk
+    """
+    def __init__(self, tokenizer, mode: str = "tokens", max_tokens: int = 200, overlap_tokens: int = 32):
+        if mode not in CHUNK_MODES:
+            raise ValueError(f"CHUNK_MODE must be one of {CHUNK_MODES}, got {mode!r}")
+        if not 0 <= overlap_tokens < max_tokens:
+            raise ValueError("Chunk overlap must be smaller than the chunk size")
+        if tokenizer is None and mode != "none":
+            raise ValueError(f"CHUNK_MODE={mode!r} needs the embedding model's tokenizer")
+        self.tokenizer = tokenizer
+        self.mode = mode
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def split(self, text: str) -> list[tuple[int, str]]:
+        """
+        Returns (character offset, chunk text) pairs in document order.
+        Documents that already fit are returned as a single chunk.
+        """
+        if self.mode == "none" or not text.strip():
+            return [(0, text)]
+
+        encoding = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+        offsets = encoding['offset_mapping']
+        if len(offsets) <= self.max_tokens:
+            return [(0, text)]
+
+        if self.mode == "tokens":
+            windows = self._token_windows(0, len(offsets))
+        else:
+            windows = self._sentence_windows(text, offsets)
+
+        chunks = []
+        for start, end in windows:
+            char_start, char_end = offsets[start][0], offsets[end - 1][1]
+            chunks.append((char_start, text[char_start:char_end]))
+        return chunks
+
+    def split_batch(self, texts: list[str]) -> list[list[tuple[int, str]]]:
+        return [self.split(text) for text in texts]
+
+    def _token_windows(self, start: int, end: int) -> list[tuple[int, int]]:
+        """
+        (first token, last token + 1) windows covering tokens start..end.
+        """
+        windows = []
+        step = self.max_tokens - self.overlap_tokens
+        for window_start in range(start, end, step):
+            window_end = min(window_start + self.max_tokens, end)
+            windows.append((window_start, window_end))
+            if window_end == end:
+                break
+        return windows
+
+    def _sentence_windows(self, text: str, offsets: list) -> list[tuple[int, int]]:
+        # Token index at which each sentence starts (a single tokenizer call for the whole text)
+        token_starts = [start for start, _ in offsets]
+        bounds = sorted({0} | {bisect.bisect_left(token_starts, m.end()) for m in SENTENCE_BOUNDARY.finditer(text)})
+        sentences = [(a, b) for a, b in zip(bounds, bounds[1:] + [len(offsets)]) if a < b]
+
+        windows = []
+        current = []
+        for start, end in sentences:
+            if end - start > self.max_tokens:
+                if current:
+                    windows.append((current[0][0], current[-1][1]))
+                    current = []
+                windows.extend(self._token_windows(start, end))
+                continue
+
+            if current and end - current[0][0] > self.max_tokens:
+                windows.append((current[0][0], current[-1][1]))
+                # Carry the trailing sentences that fit in the overlap into the next chunk
+                carried = []
+                for sentence in reversed(current):
+                    if current[-1][1] - sentence[0] > self.overlap_tokens:
+                        break
+                    carried.insert(0, sentence)
+                current = carried if not carried or end - carried[0][0] <= self.max_tokens else []
+            current.append((start, end))
+
+        if current:
+            windows.append((current[0][0], current[-1][1]))
+        return windows
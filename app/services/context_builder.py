@@ -0,0 +1,106 @@
+from app.core.config import settings
+from app.services.inference_backend import load_model
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ContextBuilder:
+    """
+    Turns the decrypted search hits into the LLM context:
+    1. drops near-duplicate hits (cosine similarity of their stored vectors)
+    2. optionally reranks the rest with a cross-encoder
+    3. packs passages, best first, into a token budget counted with the LLM's own tokenizer,
+       so nothing the model would truncate is sent and the best passages are never the ones cut
+    """
+    def __init__(self, tokenizer, max_input_tokens: int):
+        self.tokenizer = tokenizer
+        self.max_input_tokens = max_input_tokens
+
+    def build(self, question: str, documents: list[dict], vectors: list, prompt: str,
+              token_budget: int = None, rerank: bool = None) -> tuple[str, dict]:
+        """
+        documents are the search hits (best first) with their decrypted "content"; vectors
+        are their stored embeddings (None entries skip deduplication). prompt is the prompt
+        template with an empty context, so its tokens can be reserved.
+        Marks every document with "in_context" (and "rerank_score" when reranked), and
+        returns the context string plus a summary of how it was built.
+        """
+        rerank = settings.CONTEXT_RERANK if rerank is None else rerank
+        # The prompt itself counts against the model's input limit
+        available = self.max_input_tokens - self._count(prompt)
+        budget = min(token_budget or settings.CONTEXT_TOKEN_BUDGET, available)
+
+        for doc in documents:
+            doc["in_context"] = False
+        candidates = self._dedupe(documents, vectors)
+        duplicates = len(documents) - len(candidates)
+
+        if rerank and len(candidates) > 1:
+            scores = load_model("reranker").predict([(question, doc["content"]) for doc in candidates])
+            for doc, score in zip(candidates, scores):
+                doc["rerank_score"] = round(float(score), 4)
+            candidates.sort(key=lambda doc: doc["rerank_score"], reverse=True)
+
+        passages, used, truncated = self._pack(candidates, budget)
+        summary = {
+            "tokens": used,
+            "budget": budget,
+            "passages": len(passages),
+            "duplicates": duplicates,
+            "truncated": truncated,
+            "reranked": bool(rerank and len(candidates) > 1)
+        }
+        return " ".join(passages), summary
+
+    def _dedupe(self, documents: list[dict], vectors: list) -> list[dict]:
+        """
+        Keeps the best-scored hit of every group of near-identical ones.
+        """
+        kept, kept_vectors, seen_texts = [], [], set()
+        for doc, vector in zip(documents, vectors):
+            if doc["content"] in seen_texts:
+                continue
+            if vector is not None:
+                vector = np.asarray(vector, dtype=np.float32)
+                vector /= np.linalg.norm(vector) or 1.0
+                if kept_vectors and float(np.max(np.stack(kept_vectors) @ vector)) >= settings.CONTEXT_DEDUP_THRESHOLD:
+                    continue
+                kept_vectors.append(vector)
+            seen_texts.add(doc["content"])
+            kept.append(doc)
+        return kept
+
+    def _pack(self, candidates: list[dict], budget: int) -> tuple[list[str], int, bool]:
+        """
+        Greedy packing in rank order. A passage that does not fit whole is skipped,
+        unless at least CONTEXT_MIN_PASSAGE_TOKENS are left, in which case its
+        beginning fills the rest of the budget.
+        """
+        if not candidates or budget <= 0:
+            return [], 0, False
+
+        encodings = self.tokenizer(
+            [doc["content"] for doc in candidates], add_special_tokens=False, return_offsets_mapping=True
+        )["offset_mapping"]
+        passages, used, truncated = [], 0, False
+        for doc, offsets in zip(candidates, encodings):
+            remaining = budget - used
+            if len(offsets) <= remaining:
+                passages.append(doc["content"])
+                used += len(offsets)
+            elif remaining >= settings.CONTEXT_MIN_PASSAGE_TOKENS:
+                # Cut on a token boundary, so the piece tokenizes the same way
+                passages.append(doc["content"][:offsets[remaining - 1][1]])
+                used += remaining
+                truncated = True
+            else:
+                continue
+            doc["in_context"] = True
+            if used >= budget:
+                break
+        return passages, used, truncated
+
+    def _count(self, text: str) -> int:
+        return len(self.tokenizer(text)["input_ids"])
@@ -1,41 +1,127 @@
 from cryptography.fernet import Fernet
 import base64
+from typing import Optional
+from app.services import envelope
 from app.services.kms_service import KMSService
+from app.services.key_cache import DataKeyCache
+from app.core.concurrency import map_concurrently
+from app.core.executors import get_executor
+from app.core.config import settings
+
+ENCRYPTION_FORMATS = ("envelope", "fernet")
 
 class EncryptionService:
     def __init__(self):
+        if settings.ENCRYPTION_FORMAT not in ENCRYPTION_FORMATS:
+            raise ValueError(f"ENCRYPTION_FORMAT must be one of {ENCRYPTION_FORMATS}, got {settings.ENCRYPTION_FORMAT!r}")
+        # Format of new objects; both formats are always readable
+        self.format = settings.ENCRYPTION_FORMAT
         self.kms = KMSService()
+        # Plaintext DEKs are reused within the configured limits so most documents
+        # do not need their own KMS round trip.
+        self.key_cache = None
+        if settings.DEK_CACHE_ENABLED:
+            self.key_cache = DataKeyCache(
+                max_entries=settings.DEK_CACHE_MAX_ENTRIES,
+                max_age_seconds=settings.DEK_CACHE_MAX_AGE_SECONDS,
+                max_messages=settings.DEK_CACHE_MAX_MESSAGES,
+                max_bytes=settings.DEK_CACHE_MAX_BYTES
+            )
 
     def encrypt_text(self, tenant_id: str, text: str):
         """
         Encrypts text using Envelope Encryption.
-        1. Generate DEK from KMS.
+        1. Get DEK (from the cache, or generated by KMS).
         2. Encrypt text with DEK.
         3. Return Encrypted Text + Encrypted DEK.
+        In the "envelope" format the encrypted DEK travels inside the ciphertext
+        (see app/services/envelope.py) and encrypted_dek is None.
         """
-        # 1. Get Data Key from KMS
-        encrypted_dek, plaintext_dek = self.kms.generate_data_key(tenant_id)
+        plaintext = text.encode()
+
+        # 1. Get Data Key
+        encrypted_dek, plaintext_dek = self._get_encryption_key(tenant_id, len(plaintext))
+
+        if self.format == "envelope":
+            key_id = self.kms.create_key_for_tenant(tenant_id)
+            return {
+                "ciphertext": envelope.seal(plaintext, plaintext_dek, encrypted_dek, key_id),
+                "encrypted_dek": None
+            }
         
-        # 2. Encrypt text using plaintext DEK
+        # 2. Encrypt text using plaintext DEK (legacy Fernet format)
         # Fernet requires 32-byte url-safe base64 encoded key. 
         # KMS returns 32 bytes (for AES_256). We need to encode it.
         f = Fernet(base64.urlsafe_b64encode(plaintext_dek))
-        ciphertext = f.encrypt(text.encode())
+        ciphertext = f.encrypt(plaintext)
         
         return {
             "ciphertext": ciphertext, # bytes
             "encrypted_dek": encrypted_dek # bytes
         }
 
-    def decrypt_text(self, encrypted_data: bytes, encrypted_dek: bytes):
+    async def encrypt_texts(self, tenant_id: str, texts: list[str], max_concurrency: int = 8) -> list:
+        """
+        Encrypts many texts concurrently on the shared io executor. With the DEK cache
+        enabled they share the tenant's cached DEK up to the DEK_CACHE_MAX_* limits, and
+        concurrent cache misses wait for a single GenerateDataKey call; without it each
+        text gets its own DEK.
+        Returns one entry per text in input order: the encrypt_text result,
+        or the exception raised for that text (ExecutorSaturated is raised).
         """
-        Decrypts text.
-        1. Decrypt DEK using KMS.
+        return await map_concurrently(
+            get_executor("io"), self.encrypt_text, [(tenant_id, text) for text in texts], max_concurrency
+        )
+
+    def decrypt_text(self, encrypted_data: bytes, encrypted_dek: Optional[bytes], tenant_id: str):
+        """
+        Decrypts text belonging to tenant_id.
+        1. Decrypt DEK (from the cache, or using KMS with the tenant's own CMK).
         2. Decrypt text using DEK.
+        Envelope objects carry their own encrypted DEK; legacy Fernet objects need
+        the one stored next to them (encrypted_dek).
+        The key id in an envelope header is not trusted: it must be one of the tenant's
+        CMKs (the alias target or an earlier key of the tenant, see TenantKeyRegistry.owns)
+        before KMS is called with it, and the key KMS used is checked again for every
+        format, so another tenant's object is rejected. Reading never creates a key.
         """
-        # 1. Decrypt DEK using KMS
-        plaintext_dek = self.kms.decrypt_data_key(encrypted_dek)
+        if envelope.is_envelope(encrypted_data):
+            sealed = envelope.parse(encrypted_data)
+            if not self.kms.key_registry.owns(tenant_id, sealed.key_id):
+                raise ValueError(f"Object was not sealed with a key of tenant {tenant_id}")
+            plaintext_dek = self._get_decryption_key(sealed.encrypted_dek, tenant_id, sealed.key_id)
+            return envelope.unseal(sealed, plaintext_dek).decode()
+
+        if encrypted_dek is None:
+            raise ValueError("A Fernet object needs its encrypted DEK to be decrypted")
+
+        # 1. Decrypt DEK
+        plaintext_dek = self._get_decryption_key(encrypted_dek, tenant_id)
         
         # 2. Decrypt text
         f = Fernet(base64.urlsafe_b64encode(plaintext_dek))
         return f.decrypt(encrypted_data).decode()
+
+    def _get_encryption_key(self, tenant_id: str, plaintext_length: int) -> tuple[bytes, bytes]:
+        if self.key_cache:
+            return self.key_cache.get_or_generate_encryption_key(
+                tenant_id, plaintext_length, lambda: self.kms.generate_data_key(tenant_id)
+            )
+        return self.kms.generate_data_key(tenant_id)
+
+    def _get_decryption_key(self, encrypted_dek: bytes, tenant_id: str, key_id: str = None) -> bytes:
+        if self.key_cache:
+            plaintext_dek = self.key_cache.get_decryption_key(tenant_id, encrypted_dek)
+            if plaintext_dek:
+                return plaintext_dek
+
+        plaintext_dek = self.kms.decrypt_data_key(encrypted_dek, tenant_id, key_id)
+        if self.key_cache:
+            self.key_cache.put_decryption_key(tenant_id, encrypted_dek, plaintext_dek)
+        return plaintext_dek
+
+    def cache_stats(self) -> dict:
+        """
+        Hit / miss counters of the DEK cache (empty when caching is disabled).
+        """
+        return self.key_cache.stats() if self.key_cache else {}
@@ -0,0 +1,82 @@
+import os
+import struct
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+# Binary envelope for stored documents, replacing Fernet (AES-CBC + HMAC, base64 text):
+#
+#   magic "RGE" | version (1 byte) | key id length (2) | wrapped DEK length (2)
+#   | nonce (12) | key id (UTF-8) | wrapped DEK | AES-256-GCM ciphertext + 16-byte tag
+#
+# Everything before the ciphertext is the header and is authenticated as associated
+# data, so swapping the wrapped DEK or key id of an object makes decryption fail.
+# Fernet tokens always start with "gAAAAA", so the magic tells the formats apart.
+MAGIC = b"RGE"
+VERSION = 1
+NONCE_SIZE = 12
+_PREFIX = struct.Struct(">3sBHH")
+
+
+class Envelope:
+    """
+    A parsed envelope: the header fields and the ciphertext they protect.
+    """
+    __slots__ = ("key_id", "encrypted_dek", "nonce", "header", "ciphertext")
+
+    def __init__(self, key_id: str, encrypted_dek: bytes, nonce: bytes, header: bytes, ciphertext: bytes):
+        self.key_id = key_id
+        self.encrypted_dek = encrypted_dek
+        self.nonce = nonce
+        self.header = header
+        self.ciphertext = ciphertext
+
+
+def is_envelope(data: bytes) -> bool:
+    return data[:len(MAGIC)] == MAGIC
+
+
+def seal(plaintext: bytes, plaintext_dek: bytes, encrypted_dek: bytes, key_id: str) -> bytes:
+    """
+    Encrypts plaintext with the DEK and prepends the header.
+    """
+    key_id_bytes = key_id.encode()
+    # Random 96-bit nonces are safe here: a cached DEK encrypts at most
+    # DEK_CACHE_MAX_MESSAGES objects, far below the 2^32 limit for random GCM nonces.
+    nonce = os.urandom(NONCE_SIZE)
+    header = b"".join((
+        _PREFIX.pack(MAGIC, VERSION, len(key_id_bytes), len(encrypted_dek)), nonce, key_id_bytes, encrypted_dek
+    ))
+    return header + AESGCM(plaintext_dek).encrypt(nonce, plaintext, header)
+
+
+def parse(data: bytes) -> Envelope:
+    """
+    Splits an envelope into header fields and ciphertext (nothing is decrypted).
+    """
+    if len(data) < _PREFIX.size + NONCE_SIZE:
+        raise ValueError("Envelope is truncated")
+    magic, version, key_id_length, dek_length = _PREFIX.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not an envelope")
+    if version != VERSION:
+        raise ValueError(f"Unsupported envelope version {version}")
+
+    nonce_end = _PREFIX.size + NONCE_SIZE
+    key_id_end = nonce_end + key_id_length
+    header_end = key_id_end + dek_length
+    if len(data) < header_end:
+        raise ValueError("Envelope is truncated")
+    return Envelope(
+        key_id=data[nonce_end:key_id_end].decode(),
+        encrypted_dek=data[key_id_end:header_end],
+        nonce=data[_PREFIX.size:nonce_end],
+        header=data[:header_end],
+        ciphertext=data[header_end:]
+    )
+
+
+def unseal(envelope: Envelope, plaintext_dek: bytes) -> bytes:
+    """
+    Decrypts and authenticates the ciphertext and header
+    (raises cryptography's InvalidTag if either was altered).
+    """
+    return AESGCM(plaintext_dek).decrypt(envelope.nonce, envelope.ciphertext, envelope.header)
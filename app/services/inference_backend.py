@@ -0,0 +1,228 @@
+from app.core.config import settings
+import numpy as np
+import gc
+import inspect
+import os
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# "torch":     fp32 PyTorch (the reference implementation)
+# "quantized": PyTorch with int8 dynamic quantization of every nn.Linear layer
+# "onnx":      ONNX Runtime, via optimum (pip install "optimum[onnxruntime]")
+INFERENCE_BACKENDS = ("torch", "quantized", "onnx")
+
+# optimum model class for each pipeline task we run
+ORT_MODEL_CLASSES = {
+    "ner": "ORTModelForTokenClassification",
+    "text2text-generation": "ORTModelForSeq2SeqLM",
+    "feature-extraction": "ORTModelForFeatureExtraction",
+}
+
+# The models the services run: name -> (pipeline task, Hub model, pipeline kwargs).
+# "sentence-embedding" and "cross-encoder" models are loaded with sentence-transformers
+# instead of a pipeline.
+MODELS = {
+    "ner": ("ner", "dslim/bert-base-NER", {"aggregation_strategy": "simple"}),
+    "embedding": ("sentence-embedding", "all-MiniLM-L6-v2", {}),
+    "llm": ("text2text-generation", "google/flan-t5-small", {"max_length": 512}),
+    "reranker": ("cross-encoder", "cross-encoder/ms-marco-MiniLM-L-6-v2", {}),
+}
+
+# Process-wide loaded models, shared by every service instance (and, when loaded
+# before the server forks its workers, by every worker process).
+_loaded_models = {}
+_model_locks = {name: threading.Lock() for name in MODELS}
+
+
+def _backend(backend: str = None) -> str:
+    backend = backend or settings.INFERENCE_BACKEND
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"INFERENCE_BACKEND must be one of {INFERENCE_BACKENDS}, got {backend!r}")
+    return backend
+
+
+def load_model(name: str):
+    """
+    Returns the named model from MODELS on the configured backend, loading it
+    on first use. Thread-safe: concurrent callers share one load.
+    """
+    with _model_locks[name]:
+        if name not in _loaded_models:
+            task, model_name, kwargs = MODELS[name]
+            if task == "sentence-embedding":
+                _loaded_models[name] = load_sentence_transformer(model_name)
+            elif task == "cross-encoder":
+                _loaded_models[name] = load_cross_encoder(model_name)
+            else:
+                _loaded_models[name] = load_pipeline(task, model_name, **kwargs)
+        return _loaded_models[name]
+
+
+def set_model(name: str, model):
+    """
+    Installs a ready-made model under a MODELS name, e.g. a lightweight stand-in
+    for benchmarks that exercise the pipeline without loading real weights.
+    Must run before the services that use it are built.
+    """
+    with _model_locks[name]:
+        _loaded_models[name] = model
+
+
+def loaded_models() -> list[str]:
+    return [name for name in MODELS if name in _loaded_models]
+
+
+def preload_models():
+    """
+    Loads every model now. Meant to run in the server's master process before it
+    forks workers (e.g. gunicorn --preload): the weights are then shared
+    copy-on-write by all workers instead of being loaded once per worker.
+    """
+    for name in MODELS:
+        # The reranker is only needed when reranking is on by default
+        if name != "reranker" or settings.CONTEXT_RERANK:
+            load_model(name)
+    # Keep the garbage collector from touching (and so un-sharing) the pages
+    # holding these long-lived objects in the forked workers.
+    gc.freeze()
+
+
+def load_pipeline(task: str, model_name: str, backend: str = None, **kwargs):
+    """
+    Builds a transformers pipeline for the task on the configured inference backend.
+    Extra keyword arguments are passed to the pipeline (aggregation_strategy, max_length...).
+    """
+    from transformers import pipeline
+    backend = _backend(backend)
+    logger.info(f"Loading {model_name} ({task}) on the {backend} backend")
+    if backend == "onnx":
+        from transformers import AutoTokenizer
+        model = _load_ort_model(task, model_name)
+        return pipeline(task, model=model, tokenizer=AutoTokenizer.from_pretrained(model_name), **kwargs)
+
+    if settings.INFERENCE_USE_SAFETENSORS:
+        # safetensors files are memory-mapped while loading: no pickle, lower peak memory
+        kwargs["model_kwargs"] = {**kwargs.get("model_kwargs", {}), "use_safetensors": True}
+    nlp = pipeline(task, model=model_name, **kwargs)
+    if backend == "quantized":
+        nlp.model = _quantize(nlp.model)
+    return nlp
+
+
+def load_sentence_transformer(model_name: str, backend: str = None):
+    """
+    Returns an object with SentenceTransformer's encode() for the configured backend.
+    """
+    backend = _backend(backend)
+    logger.info(f"Loading {model_name} (sentence embeddings) on the {backend} backend")
+    if backend == "onnx":
+        return OnnxSentenceEncoder(model_name)
+
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(model_name, **_safetensors_kwargs(SentenceTransformer, model_name))
+    if backend == "quantized":
+        model = _quantize(model)
+    return model
+
+
+def load_cross_encoder(model_name: str, backend: str = None):
+    """
+    Returns a sentence-transformers CrossEncoder (predict() on (query, passage) pairs).
+    There is no ONNX path for it: the onnx backend runs it quantized instead.
+    """
+    from sentence_transformers import CrossEncoder
+    backend = _backend(backend)
+    logger.info(f"Loading {model_name} (cross-encoder) on the {backend} backend")
+    model = CrossEncoder(model_name, **_safetensors_kwargs(CrossEncoder, model_name))
+    if backend in ("quantized", "onnx"):
+        model.model = _quantize(model.model)
+    return model
+
+
+def _safetensors_kwargs(model_class, model_name: str) -> dict:
+    """
+    With INFERENCE_USE_SAFETENSORS, the keyword argument through which model_class
+    passes use_safetensors on to transformers' from_pretrained: model_kwargs
+    (sentence-transformers >= 2.3) or automodel_args (CrossEncoder in older releases).
+    Older SentenceTransformer has neither; it then loads whatever weights the model
+    ships, and a warning says so.
+    """
+    if not settings.INFERENCE_USE_SAFETENSORS:
+        return {}
+    parameters = inspect.signature(model_class.__init__).parameters
+    for name in ("model_kwargs", "automodel_args"):
+        if name in parameters:
+            return {name: {"use_safetensors": True}}
+    logger.warning(
+        f"INFERENCE_USE_SAFETENSORS is not enforced for {model_name}: this {model_class.__name__} "
+        f"cannot pass it to transformers (needs sentence-transformers>=2.3)"
+    )
+    return {}
+
+
+def _quantize(model):
+    """
+    int8 dynamic quantization: Linear weights are stored as int8 and activations are
+    quantized on the fly, which is where nearly all of the CPU time of these models goes.
+    """
+    import torch
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _load_ort_model(task: str, model_name: str):
+    """
+    Loads the ONNX export of a Hub model. The export is slow, so when
+    INFERENCE_MODEL_DIR is set it is done once and reused by later workers.
+    """
+    try:
+        import optimum.onnxruntime as ort
+    except ImportError as e:
+        raise ImportError('INFERENCE_BACKEND=onnx requires optimum: pip install "optimum[onnxruntime]"') from e
+
+    model_class = getattr(ort, ORT_MODEL_CLASSES[task])
+    if not settings.INFERENCE_MODEL_DIR:
+        return model_class.from_pretrained(model_name, export=True)
+
+    export_dir = os.path.join(settings.INFERENCE_MODEL_DIR, model_name.replace("/", "--"))
+    if os.path.isdir(export_dir):
+        return model_class.from_pretrained(export_dir)
+    model = model_class.from_pretrained(model_name, export=True)
+    model.save_pretrained(export_dir)
+    logger.info(f"Saved ONNX export of {model_name} to {export_dir}")
+    return model
+
+
+class OnnxSentenceEncoder:
+    """
+    Minimal ONNX Runtime replacement for SentenceTransformer.encode, for models
+    (like all-MiniLM-L6-v2) whose modules are Transformer -> mean Pooling -> Normalize.
+    """
+    def __init__(self, model_name: str, max_seq_length: int = 256):
+        from transformers import AutoTokenizer
+        hub_name = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        self.model = _load_ort_model("feature-extraction", hub_name)
+        self.tokenizer = AutoTokenizer.from_pretrained(hub_name)
+        self.max_seq_length = max_seq_length
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+
+        batches = []
+        for i in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(
+                texts[i:i + batch_size], padding=True, truncation=True,
+                max_length=self.max_seq_length, return_tensors="np"
+            )
+            token_embeddings = self.model(**inputs).last_hidden_state
+            # Mean over the real (non-padding) tokens, then L2 normalize
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            batches.append(pooled / np.linalg.norm(pooled, axis=1, keepdims=True))
+
+        if not batches:
+            return np.zeros((0, self.model.config.hidden_size), np.float32)
+        embeddings = np.concatenate(batches).astype(np.float32)
+        return embeddings[0] if single else embeddings
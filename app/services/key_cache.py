@@ -0,0 +1,162 @@
+import threading
+from typing import Optional
+from app.core.cache import LRUCache
+
+
+class CachedDataKey:
+    """
+    A plaintext DEK plus the usage counters needed to enforce the cache's security thresholds.
+    """
+    __slots__ = ("encrypted_dek", "plaintext_dek", "messages", "bytes")
+
+    def __init__(self, encrypted_dek: bytes, plaintext_dek: bytes):
+        self.encrypted_dek = encrypted_dek
+        self.plaintext_dek = plaintext_dek
+        self.messages = 0
+        self.bytes = 0
+
+
+class DataKeyCache:
+    """
+    In-memory cache of plaintext data keys, modelled on the AWS Encryption SDK
+    caching CMM:
+    - Encryption entries are keyed per tenant and reused until they hit the max age,
+      max messages or max bytes threshold, after which a fresh DEK is generated.
+    - Decryption entries are keyed by tenant and encrypted DEK blob, so every document
+      sealed with the same DEK is readable after a single KMS Decrypt call, and a
+      DEK unwrapped for one tenant is never handed out for another.
+    Both sides are bounded LRUs with a TTL.
+    Concurrent encryption misses for one tenant are coalesced (get_or_generate_encryption_key),
+    so a burst of documents costs one GenerateDataKey call instead of one per thread.
+    """
+    def __init__(self, max_entries: int, max_age_seconds: float, max_messages: int, max_bytes: int):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self._encryption_keys = LRUCache(max_entries, ttl_seconds=max_age_seconds)
+        self._decryption_keys = LRUCache(max_entries, ttl_seconds=max_age_seconds)
+        self._lock = threading.Lock()
+        # tenant_id -> lock held while a DEK is generated for that tenant
+        self._tenant_locks = {}
+        self.encrypt_hits = 0
+        self.encrypt_misses = 0
+        self.decrypt_hits = 0
+        self.decrypt_misses = 0
+
+    def get_encryption_key(self, tenant_id: str, plaintext_length: int) -> Optional[tuple[bytes, bytes]]:
+        """
+        Returns (encrypted_dek, plaintext_dek) if a cached DEK may protect one more
+        message of plaintext_length bytes, otherwise None. A hit counts the usage.
+        """
+        with self._lock:
+            cached = self._take_encryption_key(tenant_id, plaintext_length)
+            if cached:
+                self.encrypt_hits += 1
+            else:
+                self.encrypt_misses += 1
+            return cached
+
+    def get_or_generate_encryption_key(self, tenant_id: str, plaintext_length: int, generate) -> tuple[bytes, bytes]:
+        """
+        Like get_encryption_key, but on a miss calls generate() -> (encrypted_dek, plaintext_dek)
+        and caches the result. Threads missing for the same tenant at the same time
+        wait for that one call and then share the new DEK.
+        """
+        cached = self.get_encryption_key(tenant_id, plaintext_length)
+        if cached:
+            return cached
+        if not self._shareable(plaintext_length):
+            # The new DEK could not protect a second message like this one: nothing to wait for
+            encrypted_dek, plaintext_dek = generate()
+            self.put_encryption_key(tenant_id, encrypted_dek, plaintext_dek, plaintext_length)
+            return encrypted_dek, plaintext_dek
+
+        with self._tenant_lock(tenant_id):
+            # Another thread may have cached a fresh DEK while this one waited
+            with self._lock:
+                cached = self._take_encryption_key(tenant_id, plaintext_length)
+            if cached:
+                return cached
+            encrypted_dek, plaintext_dek = generate()
+            self.put_encryption_key(tenant_id, encrypted_dek, plaintext_dek, plaintext_length)
+            return encrypted_dek, plaintext_dek
+
+    def put_encryption_key(self, tenant_id: str, encrypted_dek: bytes, plaintext_dek: bytes, plaintext_length: int):
+        """
+        Caches a freshly generated DEK, counting the message it is about to protect.
+        The DEK is also made available for decryption.
+        """
+        self.put_decryption_key(tenant_id, encrypted_dek, plaintext_dek)
+
+        # A single message larger than the byte limit is never cached (same rule as the AWS SDK)
+        if plaintext_length > self.max_bytes:
+            return
+
+        entry = CachedDataKey(encrypted_dek, plaintext_dek)
+        entry.messages = 1
+        entry.bytes = plaintext_length
+        with self._lock:
+            self._encryption_keys.put(tenant_id, entry)
+
+    def get_decryption_key(self, tenant_id: str, encrypted_dek: bytes) -> Optional[bytes]:
+        plaintext_dek = self._decryption_keys.get((tenant_id, encrypted_dek))
+        with self._lock:
+            if plaintext_dek is None:
+                self.decrypt_misses += 1
+            else:
+                self.decrypt_hits += 1
+        return plaintext_dek
+
+    def put_decryption_key(self, tenant_id: str, encrypted_dek: bytes, plaintext_dek: bytes):
+        self._decryption_keys.put((tenant_id, encrypted_dek), plaintext_dek)
+
+    def clear(self):
+        self._encryption_keys.clear()
+        self._decryption_keys.clear()
+        with self._lock:
+            self._tenant_locks.clear()
+
+    def stats(self) -> dict:
+        return {
+            "encrypt": {
+                "hits": self.encrypt_hits,
+                "misses": self.encrypt_misses,
+                "size": len(self._encryption_keys),
+                "evictions": self._encryption_keys.evictions
+            },
+            "decrypt": {
+                "hits": self.decrypt_hits,
+                "misses": self.decrypt_misses,
+                "size": len(self._decryption_keys),
+                "evictions": self._decryption_keys.evictions
+            }
+        }
+
+    def _take_encryption_key(self, tenant_id: str, plaintext_length: int) -> Optional[tuple[bytes, bytes]]:
+        # Caller holds self._lock
+        entry = self._encryption_keys.get(tenant_id)
+        if entry is not None and self._within_limits(entry, plaintext_length):
+            entry.messages += 1
+            entry.bytes += plaintext_length
+            return entry.encrypted_dek, entry.plaintext_dek
+
+        if entry is not None:
+            # Usage threshold reached: retire the DEK so the next one is fresh
+            self._encryption_keys.pop(tenant_id)
+        return None
+
+    def _tenant_lock(self, tenant_id: str) -> threading.Lock:
+        with self._lock:
+            lock = self._tenant_locks.get(tenant_id)
+            if lock is None:
+                lock = self._tenant_locks[tenant_id] = threading.Lock()
+            return lock
+
+    def _shareable(self, plaintext_length: int) -> bool:
+        # Whether a DEK generated for this message could also protect another of the same size
+        return self.max_messages >= 2 and 2 * plaintext_length <= self.max_bytes
+
+    def _within_limits(self, entry: CachedDataKey, plaintext_length: int) -> bool:
+        return (
+            entry.messages + 1 <= self.max_messages
+            and entry.bytes + plaintext_length <= self.max_bytes
+        )
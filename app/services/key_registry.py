@@ -0,0 +1,141 @@
+import threading
+import logging
+from typing import Optional
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+ALIAS_PREFIX = "alias/tenant_"
+# Every tenant key carries this tag; keys created for a rotation need it too
+TENANT_TAG = "TenantID"
+
+
+def bare_key_id(key_id: str) -> str:
+    # "arn:aws:kms:<region>:<account>:key/<id>" -> "<id>"
+    return key_id.rsplit("/", 1)[-1] if key_id.startswith("arn:") else key_id
+
+
+class TenantKeyRegistry:
+    """
+    Resolves each tenant's CMK alias (alias/tenant_{id}) to a KeyId once and caches it.
+    - First-time lookups for the same tenant are coalesced behind a per-tenant lock,
+      so a burst of requests for a new tenant creates exactly one key.
+    - warm() preloads the cache from list_aliases at startup.
+    - owns() tells whether a key belongs to a tenant, for reading objects sealed
+      under earlier keys after the alias was retargeted (rotation).
+    """
+    def __init__(self, client):
+        self.client = client
+        self._key_ids = {}
+        # Bare KeyId -> TenantID tag of the key (None if untagged or gone)
+        self._owners = {}
+        self._tenant_locks = {}
+        self._guard = threading.Lock()
+
+    def alias_for(self, tenant_id: str) -> str:
+        return f"{ALIAS_PREFIX}{tenant_id}"
+
+    def resolve(self, tenant_id: str) -> str:
+        """
+        Returns the tenant's KeyId, creating the CMK + alias if it does not exist yet.
+        """
+        key_id = self._key_ids.get(tenant_id)
+        if key_id:
+            return key_id
+
+        with self._lock_for(tenant_id):
+            # Another thread may have resolved it while we were waiting
+            key_id = self._key_ids.get(tenant_id)
+            if key_id:
+                return key_id
+
+            key_id = self._describe(self.alias_for(tenant_id)) or self._create(tenant_id)
+            self._key_ids[tenant_id] = key_id
+            return key_id
+
+    def lookup(self, tenant_id: str) -> Optional[str]:
+        """
+        Like resolve(), but for read paths: returns None instead of creating a key.
+        """
+        key_id = self._key_ids.get(tenant_id)
+        if key_id:
+            return key_id
+
+        with self._lock_for(tenant_id):
+            key_id = self._key_ids.get(tenant_id) or self._describe(self.alias_for(tenant_id))
+            if key_id:
+                self._key_ids[tenant_id] = key_id
+            return key_id
+
+    def owns(self, tenant_id: str, key_id: str) -> bool:
+        """
+        Whether key_id (a KeyId or key ARN) is one of the tenant's CMKs: the current
+        target of its alias, or any key tagged TenantID=tenant_id, such as the key the
+        alias pointed to before a rotation. Never creates anything; verdicts are cached.
+        """
+        key_id = bare_key_id(key_id)
+        if key_id == self.lookup(tenant_id):
+            return True
+        if key_id not in self._owners:
+            self._owners[key_id] = self._tagged_tenant(key_id)
+        return self._owners[key_id] == tenant_id
+
+    def invalidate(self, tenant_id: str):
+        self._key_ids.pop(tenant_id, None)
+
+    def warm(self) -> int:
+        """
+        Loads every existing tenant alias into the cache. Returns the number of tenants found.
+        """
+        found = 0
+        paginator = self.client.get_paginator("list_aliases")
+        for page in paginator.paginate():
+            for alias in page["Aliases"]:
+                alias_name = alias["AliasName"]
+                if alias_name.startswith(ALIAS_PREFIX) and alias.get("TargetKeyId"):
+                    self._key_ids[alias_name[len(ALIAS_PREFIX):]] = alias["TargetKeyId"]
+                    found += 1
+        logger.info(f"Warmed KMS key registry with {found} tenant keys.")
+        return found
+
+    def _lock_for(self, tenant_id: str) -> threading.Lock:
+        with self._guard:
+            return self._tenant_locks.setdefault(tenant_id, threading.Lock())
+
+    def _describe(self, alias_name: str) -> Optional[str]:
+        try:
+            return self.client.describe_key(KeyId=alias_name)["KeyMetadata"]["KeyId"]
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "NotFoundException":
+                return None
+            raise
+
+    def _tagged_tenant(self, key_id: str) -> Optional[str]:
+        try:
+            tags = self.client.list_resource_tags(KeyId=key_id)["Tags"]
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "NotFoundException":
+                return None
+            raise
+        return next((tag["TagValue"] for tag in tags if tag["TagKey"] == TENANT_TAG), None)
+
+    def _create(self, tenant_id: str) -> str:
+        alias_name = self.alias_for(tenant_id)
+        logger.info(f"Creating new KMS key for tenant {tenant_id}...")
+        response = self.client.create_key(
+            Description=f"Key for tenant {tenant_id}",
+            Tags=[{'TagKey': TENANT_TAG, 'TagValue': tenant_id}]
+        )
+        key_id = response['KeyMetadata']['KeyId']
+
+        try:
+            self.client.create_alias(AliasName=alias_name, TargetKeyId=key_id)
+            return key_id
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "AlreadyExistsException":
+                raise
+
+        # Another process created the alias first: use its key and retire ours
+        logger.info(f"KMS alias for tenant {tenant_id} was created concurrently, discarding duplicate key.")
+        self.client.schedule_key_deletion(KeyId=key_id, PendingWindowInDays=7)
+        return self._describe(alias_name)
@@ -1,74 +1,56 @@
-import boto3
 from botocore.exceptions import ClientError
-from app.core.config import settings
+from app.core.aws import get_client
+from app.services.key_registry import TenantKeyRegistry
+from app.core.metrics import observe_stage
 
 class KMSService:
     def __init__(self):
-        self.client = boto3.client(
-            "kms",
-            endpoint_url=settings.AWS_ENDPOINT_URL,
-            region_name=settings.AWS_REGION,
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        )
+        # Shared, pooled client (see app/core/aws.py)
+        self.client = get_client("kms")
+        self.key_registry = TenantKeyRegistry(self.client)
 
     def create_key_for_tenant(self, tenant_id: str) -> str:
         """
-        Ensures a CMK exists for the tenant. Returns the KeyId (or Alias).
+        Ensures a CMK exists for the tenant. Returns the KeyId.
+        Resolved KeyIds are cached by the key registry, so this only talks to KMS
+        the first time a tenant is seen.
         """
-        alias_name = f"alias/tenant_{tenant_id}"
-        
-        try:
-            # Check if alias exists by trying to describe it (or list aliases)
-            # For simplicity in PoC, we try to create it, and if it fails, we assume it exists.
-            # But create_alias doesn't return the key ID if it fails.
-            # So let's try to generate a data key with the alias. If it works, key exists.
-            self.client.generate_data_key(KeyId=alias_name, KeySpec='AES_256')
-            return alias_name
-        except ClientError:
-            # If it fails (likely NotFound), create it.
-            pass
-
-        print(f"Creating new KMS key for tenant {tenant_id}...")
-        try:
-            response = self.client.create_key(
-                Description=f"Key for tenant {tenant_id}",
-                Tags=[{'TagKey': 'TenantID', 'TagValue': tenant_id}]
-            )
-            key_id = response['KeyMetadata']['KeyId']
-            
-            self.client.create_alias(
-                AliasName=alias_name,
-                TargetKeyId=key_id
-            )
-            return key_id
-        except Exception as e:
-            print(f"Error creating key: {e}")
-            raise e
+        return self.key_registry.resolve(tenant_id)
 
     def get_key_id(self, tenant_id: str) -> str:
-        return f"alias/tenant_{tenant_id}"
+        return self.key_registry.alias_for(tenant_id)
 
     def generate_data_key(self, tenant_id: str):
         """
         Generates a DEK (Data Encryption Key) using the tenant's CMK.
         Returns (CiphertextBlob, PlaintextKey).
         """
-        # Ensure key exists first
-        self.create_key_for_tenant(tenant_id)
-        
-        key_id = self.get_key_id(tenant_id)
-        response = self.client.generate_data_key(
-            KeyId=key_id,
-            KeySpec='AES_256'
-        )
+        key_id = self.create_key_for_tenant(tenant_id)
+        with observe_stage("kms_generate_data_key", tenant_id):
+            try:
+                response = self.client.generate_data_key(KeyId=key_id, KeySpec='AES_256')
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "NotFoundException":
+                    raise
+                # The cached key was deleted behind our back: resolve it again and retry once
+                self.key_registry.invalidate(tenant_id)
+                key_id = self.create_key_for_tenant(tenant_id)
+                response = self.client.generate_data_key(KeyId=key_id, KeySpec='AES_256')
         return response['CiphertextBlob'], response['Plaintext']
 
-    def decrypt_data_key(self, encrypted_key_blob: bytes) -> bytes:
+    def decrypt_data_key(self, encrypted_key_blob: bytes, tenant_id: str, key_id: str = None) -> bytes:
         """
-        Decrypts the DEK using KMS.
+        Decrypts the DEK using KMS and checks that the key KMS used is one of the
+        tenant's CMKs (current or pre-rotation), so another tenant's DEK is refused.
+        Pass key_id (already checked with key_registry.owns) to have KMS refuse a DEK
+        wrapped by any other key. Never creates a key.
         """
-        response = self.client.decrypt(
-            CiphertextBlob=encrypted_key_blob
-        )
+        kwargs = {"KeyId": key_id} if key_id else {}
+        with observe_stage("kms_decrypt", tenant_id):
+            response = self.client.decrypt(
+                CiphertextBlob=encrypted_key_blob,
+                **kwargs
+            )
+        if not self.key_registry.owns(tenant_id, response["KeyId"]):
+            raise ValueError(f"Data key was not wrapped by a key of tenant {tenant_id}")
         return response['Plaintext']
@@ -1,17 +1,20 @@
-from transformers import pipeline
+from app.core.config import settings
+from app.services.inference_backend import load_model
+import threading
 import logging
 
 logger = logging.getLogger(__name__)
 
+NO_CONTEXT_ANSWER = "I don't have enough information to answer that."
+GENERATION_ERROR_ANSWER = "Error generating answer."
+# flan-t5's input limit; longer prompts are truncated
+MAX_INPUT_TOKENS = 512
+
 class LLMService:
     def __init__(self):
         logger.info("Loading LLM for RAG Generation...")
         # flan-t5-small is lightweight and good for simple QA
-        self.generator = pipeline(
-            "text2text-generation", 
-            model="google/flan-t5-small", 
-            max_length=512
-        )
+        self.generator = load_model("llm")
         logger.info("LLM loaded.")
 
     def generate_answer(self, context: str, question: str) -> str:
@@ -19,14 +22,64 @@ class LLMService:
         Generates an answer based on the provided context.
         """
         if not context:
-            return "I don't have enough information to answer that."
+            return NO_CONTEXT_ANSWER
 
-        # Prompt Engineering for FLAN-T5
-        prompt = f"question: {question} context: {context}"
-        
         try:
-            output = self.generator(prompt)
+            output = self.generator(self.build_prompt(context, question), truncation=True)
             return output[0]['generated_text']
         except Exception as e:
             logger.error(f"LLM Generation failed: {e}")
-            return "Error generating answer."
+            return GENERATION_ERROR_ANSWER
+
+    def create_streamer(self):
+        """
+        Returns an iterator that yields the answer text piece by piece while
+        generate_into() runs on another thread.
+        """
+        from transformers import TextIteratorStreamer
+        return TextIteratorStreamer(
+            self.generator.tokenizer,
+            skip_special_tokens=True,
+            timeout=settings.LLM_STREAM_TIMEOUT_SECONDS
+        )
+
+    def generate_into(self, context: str, question: str, streamer, cancelled: threading.Event = None):
+        """
+        Generates an answer, pushing decoded text into the streamer as tokens are produced.
+        Blocks until generation is done. The streamer is always ended, even on failure,
+        so its reader never waits for text that will not come.
+        Setting cancelled (e.g. when the client disconnects) stops decoding after the current token.
+        """
+        if not context:
+            streamer.on_finalized_text(NO_CONTEXT_ANSWER, stream_end=True)
+            return
+
+        try:
+            if cancelled is not None and cancelled.is_set():
+                streamer.end()
+                return
+            tokenizer = self.generator.tokenizer
+            inputs = tokenizer(self.build_prompt(context, question), return_tensors="pt", truncation=True, max_length=MAX_INPUT_TOKENS)
+            kwargs = {"stopping_criteria": _stop_when_set(cancelled)} if cancelled is not None else {}
+            self.generator.model.generate(**inputs, streamer=streamer, max_length=512, **kwargs)
+        except Exception as e:
+            logger.error(f"LLM Generation failed: {e}")
+            streamer.end()
+            raise
+
+    def build_prompt(self, context: str, question: str) -> str:
+        # Prompt Engineering for FLAN-T5
+        return f"question: {question} context: {context}"
+
+
+def _stop_when_set(event: threading.Event):
+    """
+    Stopping criteria that end generate() at the next decoding step once event is set.
+    """
+    from transformers import StoppingCriteria, StoppingCriteriaList
+
+    class EventSet(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs) -> bool:
+            return event.is_set()
+
+    return StoppingCriteriaList([EventSet()])
@@ -0,0 +1,63 @@
+import json
+import re
+
+# Structured PII that a regex catches more reliably (and far more cheaply) than NER
+EMAIL_PATTERN = re.compile(r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b")
+# 13-19 digits, optionally grouped with spaces or dashes (validated with Luhn below)
+CARD_PATTERN = re.compile(r"\b(?:\d[ -]?){12,18}\d\b")
+SSN_PATTERN = re.compile(r"\b\d{3}-\d{2}-\d{4}\b")
+# Only phone-shaped numbers, so years, amounts and ID-like digit runs ("1999 2000 2001",
+# "2023-1234-5678") are left alone: a country code (+44 20 7946 0958), an area code in
+# parentheses ((555) 123-4567) or a 3-3-4 layout with one separator (555.123.4567)
+PHONE_PATTERN = re.compile(
+    r"(?<![\w+])(?:"
+    r"\+\d{1,3}[ .-]?(?:\(\d{1,4}\)|\d{1,4})(?:[ .-]?\d{2,4}){2,3}"
+    r"|\(\d{3}\)[ .-]?\d{3}[ .-]?\d{4}"
+    r"|\d{3}([ .-])\d{3}\1\d{4}"
+    r")\b"
+)
+
+
+def luhn_valid(number: str) -> bool:
+    digits = [int(d) for d in number if d.isdigit()]
+    checksum = 0
+    for i, digit in enumerate(reversed(digits)):
+        if i % 2 == 1:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        checksum += digit
+    return checksum % 10 == 0
+
+
+def find_structured_pii(text: str) -> list[tuple[int, int, str]]:
+    """
+    Returns (start, end, label) spans for emails, card numbers, SSNs and phone numbers.
+    """
+    spans = [(m.start(), m.end(), "EMAIL") for m in EMAIL_PATTERN.finditer(text)]
+    spans += [(m.start(), m.end(), "CARD") for m in CARD_PATTERN.finditer(text) if luhn_valid(m.group())]
+    spans += [(m.start(), m.end(), "SSN") for m in SSN_PATTERN.finditer(text)]
+    spans += [(m.start(), m.end(), "PHONE") for m in PHONE_PATTERN.finditer(text)]
+    return spans
+
+
+class Gazetteer:
+    """
+    Exact-match list of known sensitive terms (e.g. client or project names),
+    loaded from a JSON file of the form {"ORG": ["Acme Corp", ...], "PER": [...]}.
+    Matching is case-insensitive on word boundaries.
+    """
+    def __init__(self, terms_by_label: dict[str, list[str]]):
+        self.patterns = [
+            (label, re.compile(r"\b(?:" + "|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True)) + r")\b", re.IGNORECASE))
+            for label, terms in terms_by_label.items()
+            if terms
+        ]
+
+    @classmethod
+    def from_file(cls, path: str) -> "Gazetteer":
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def find(self, text: str) -> list[tuple[int, int, str]]:
+        return [(m.start(), m.end(), label) for label, pattern in self.patterns for m in pattern.finditer(text)]
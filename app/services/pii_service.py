@@ -1,42 +1,123 @@
-from transformers import pipeline
+from app.core.config import settings
+from app.services.inference_backend import load_model
+from app.services.pii_patterns import find_structured_pii, Gazetteer
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# NER entity groups we redact: PER (Person), ORG (Organization), LOC (Location)
+NER_LABELS = {'PER', 'ORG', 'LOC'}
+
 class PIIScrubber:
     def __init__(self):
+        if not 0 <= settings.PII_CHUNK_OVERLAP < settings.PII_CHUNK_TOKENS:
+            # Otherwise long documents would get no NER windows at all (names stored in clear)
+            raise ValueError("PII_CHUNK_OVERLAP must be smaller than PII_CHUNK_TOKENS")
         logger.info("Loading NER model for PII Scrubbing...")
-        # Using a standard BERT-NER model. 
+        # Using a standard BERT-NER model (dslim/bert-base-NER).
         # aggregation_strategy="simple" groups sub-word tokens into whole words.
-        self.nlp = pipeline("ner", model="dslim/bert-base-NER", aggregation_strategy="simple")
+        self.nlp = load_model("ner")
         logger.info("NER model loaded.")
 
+        # Long documents are split into overlapping token windows that fit the model
+        self.chunk_tokens = settings.PII_CHUNK_TOKENS
+        self.chunk_overlap = settings.PII_CHUNK_OVERLAP
+        self.batch_size = settings.PII_NER_BATCH_SIZE
+        self.gazetteer = Gazetteer.from_file(settings.PII_GAZETTEER_PATH) if settings.PII_GAZETTEER_PATH else None
+
     def scrub(self, text: str) -> str:
         """
         Detects PII entities (Person, Organization, Location) and replaces them with placeholders.
+        Structured PII (emails, phone numbers, card numbers, SSNs) is caught by regex.
         Example: "John works at Google" -> "<PER> works at <ORG>"
         """
-        if not text:
-            return ""
-
-        results = self.nlp(text)
-        
-        # Sort results by start index in descending order to replace without messing up indices
-        results.sort(key=lambda x: x['start'], reverse=True)
-        
-        # Convert to list of characters for mutable replacement
-        scrubbed_text_list = list(text)
-        
-        for entity in results:
-            # We focus on PER (Person), ORG (Organization), LOC (Location)
-            if entity['entity_group'] in ['PER', 'ORG', 'LOC']:
-                start = entity['start']
-                end = entity['end']
-                replacement = f"<{entity['entity_group']}>"
-                
-                # Replace the slice
-                scrubbed_text_list[start:end] = replacement
-                
-        return "".join(scrubbed_text_list)
+        return self.scrub_batch([text])[0]
+
+    def scrub_batch(self, texts: list[str], batch_size: int = None) -> list[str]:
+        """
+        Scrubs many documents at once. Every document is split into overlapping
+        token windows, and the windows of all documents go through the NER
+        pipeline together in batched forward passes.
+        Returns the scrubbed texts in input order.
+        """
+        # (document index, character offset of the window, window text)
+        chunks = []
+        for i, text in enumerate(texts):
+            # The pipeline chokes on empty strings, so only non-empty texts are sent to the model
+            if text:
+                chunks.extend((i, offset, chunk) for offset, chunk in self._split(text))
+
+        spans = [self._fast_path_spans(text) if text else [] for text in texts]
+        if chunks:
+            batch_results = self.nlp([chunk for _, _, chunk in chunks], batch_size=batch_size or self.batch_size)
+            for (i, offset, _), results in zip(chunks, batch_results):
+                spans[i].extend(
+                    (offset + entity['start'], offset + entity['end'], entity['entity_group'])
+                    for entity in results
+                    if entity['entity_group'] in NER_LABELS
+                )
+
+        return [self._redact(text, doc_spans) if text else "" for text, doc_spans in zip(texts, spans)]
+
+    def _fast_path_spans(self, text: str) -> list[tuple[int, int, str]]:
+        """
+        Regex / gazetteer matches: no model call needed.
+        """
+        spans = find_structured_pii(text)
+        if self.gazetteer:
+            spans.extend(self.gazetteer.find(text))
+        return spans
+
+    def _split(self, text: str) -> list[tuple[int, str]]:
+        """
+        Splits text into windows of at most chunk_tokens tokens, consecutive windows
+        sharing chunk_overlap tokens so an entity cut by one border is whole in the
+        next window. Returns (character offset, window text) pairs.
+        """
+        encoding = self.nlp.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+        offsets = encoding['offset_mapping']
+        if len(offsets) <= self.chunk_tokens:
+            return [(0, text)]
+
+        windows = []
+        step = self.chunk_tokens - self.chunk_overlap
+        for start in range(0, len(offsets), step):
+            end = min(start + self.chunk_tokens, len(offsets))
+            char_start, char_end = offsets[start][0], offsets[end - 1][1]
+            windows.append((char_start, text[char_start:char_end]))
+            if end == len(offsets):
+                break
+        return windows
+
+    def _redact(self, text: str, spans: list[tuple[int, int, str]]) -> str:
+        """
+        Replaces the detected spans with <LABEL> placeholders in one pass of string slicing.
+        Overlapping spans (same entity seen by two windows, or by NER and regex) are merged.
+        """
+        parts = []
+        position = 0
+        for start, end, label in _merge_spans(spans):
+            parts.append(text[position:start])
+            parts.append(f"<{label}>")
+            position = end
+        parts.append(text[position:])
+        return "".join(parts)
+
+
+def _merge_spans(spans: list[tuple[int, int, str]]) -> list[tuple[int, int, str]]:
+    """
+    Sorts spans and unions overlapping ones. A merged span keeps the label of its
+    longest member.
+    """
+    merged = []
+    for start, end, label in sorted(spans):
+        if merged and start < merged[-1][1]:
+            last_start, last_end, last_label = merged[-1]
+            if end - start > last_end - last_start:
+                last_label = label
+            merged[-1] = (last_start, max(last_end, end), last_label)
+        else:
+            merged.append((start, end, label))
+    return merged
@@ -1,16 +1,13 @@
-import boto3
 from app.core.config import settings
+from app.core.aws import get_client
+from app.core.concurrency import map_concurrently
+from app.core.executors import get_executor
 import io
 
 class StorageService:
     def __init__(self):
-        self.s3 = boto3.client(
-            "s3",
-            endpoint_url=settings.AWS_ENDPOINT_URL,
-            region_name=settings.AWS_REGION,
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        )
+        # Shared, pooled client (see app/core/aws.py)
+        self.s3 = get_client("s3")
         self.bucket = settings.S3_BUCKET_NAME
 
     def upload_file(self, file_key: str, file_content: bytes):
@@ -30,3 +27,11 @@ class StorageService:
         """
         response = self.s3.get_object(Bucket=self.bucket, Key=file_key)
         return response['Body'].read()
+
+    async def upload_files(self, files: list[tuple[str, bytes]], max_concurrency: int = 8) -> list:
+        """
+        Uploads many (file_key, file_content) pairs to S3 in parallel on the shared io executor.
+        Returns one entry per file in input order: the S3 URI, or the exception
+        raised for that upload (ExecutorSaturated is raised).
+        """
+        return await map_concurrently(get_executor("io"), self.upload_file, files, max_concurrency)
@@ -1,81 +1,415 @@
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
+from qdrant_client.http.exceptions import UnexpectedResponse
 from app.core.config import settings
-from sentence_transformers import SentenceTransformer
+from app.core.batching import MicroBatcher
+from app.core.cache import LRUCache
+from app.services.inference_backend import load_model
+from typing import Optional
 import uuid
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+VECTOR_SIZE = 384  # all-MiniLM-L6-v2
+TENANT_COLLECTION_PREFIX = "tenant_"
+TENANCY_MODES = ("collection", "shared")
+TENANT_REGISTRY_SUFFIX = "_registry"
+
+
+def build_qdrant_client() -> QdrantClient:
+    """
+    Client for the configured Qdrant: embedded (QDRANT_LOCATION set) or a server
+    at QDRANT_HOST:QDRANT_PORT. Shared with the maintenance scripts.
+    """
+    if settings.QDRANT_LOCATION == ":memory:":
+        return QdrantClient(location=":memory:")
+    if settings.QDRANT_LOCATION:
+        return QdrantClient(path=settings.QDRANT_LOCATION)
+    return QdrantClient(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT)
+
+
+def create_shared_collection(client: QdrantClient, collection_name: str, vector_size: int):
+    """
+    Creates the single multi-tenant collection used by the "shared" tenancy mode.
+    m=0 disables the global HNSW graph and payload_m builds one graph per tenant_id
+    value instead, so every tenant still gets its own small index. The keyword
+    index on tenant_id keeps the mandatory tenant filter cheap.
+    """
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=models.VectorParams(size=vector_size, distance=models.Distance.COSINE),
+        hnsw_config=models.HnswConfigDiff(payload_m=16, m=0)
+    )
+    client.create_payload_index(
+        collection_name=collection_name,
+        field_name="tenant_id",
+        field_schema=models.PayloadSchemaType.KEYWORD
+    )
+    ensure_tenant_registry(client, tenant_registry_name(collection_name))
+
+
+def tenant_registry_name(shared_collection_name: str) -> str:
+    return f"{shared_collection_name}{TENANT_REGISTRY_SUFFIX}"
+
+
+def ensure_tenant_registry(client: QdrantClient, registry_name: str) -> bool:
+    """
+    Creates the tenant registry of a shared collection: one tiny point per tenant,
+    so listing tenants reads O(tenants) points instead of scrolling every document.
+    Returns True if it was created.
+    """
+    try:
+        client.create_collection(
+            collection_name=registry_name,
+            vectors_config=models.VectorParams(size=1, distance=models.Distance.DOT)
+        )
+        return True
+    except Exception:
+        # Another worker created it first
+        if any(c.name == registry_name for c in client.get_collections().collections):
+            return False
+        raise
+
+
+def register_tenants(client: QdrantClient, registry_name: str, tenant_ids):
+    """
+    Idempotent: a tenant's registry point ID is derived from its tenant_id.
+    """
+    client.upsert(
+        collection_name=registry_name,
+        points=[
+            models.PointStruct(id=str(uuid.uuid5(uuid.NAMESPACE_URL, f"tenant:{tenant_id}")), vector=[1.0],
+                               payload={"tenant_id": tenant_id})
+            for tenant_id in tenant_ids
+        ]
+    )
+
+
+def scroll_tenant_ids(client: QdrantClient, collection_name: str) -> set:
+    """
+    Collects the distinct tenant_ids of a collection (payload only, no vectors).
+    """
+    tenants = set()
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=1000,
+            offset=offset,
+            with_payload=["tenant_id"],
+            with_vectors=False
+        )
+        tenants.update(p.payload["tenant_id"] for p in points if p.payload and "tenant_id" in p.payload)
+        if offset is None:
+            return tenants
+
 
 class VectorService:
     def __init__(self):
-        self.client = QdrantClient(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT)
+        if settings.TENANCY_MODE not in TENANCY_MODES:
+            raise ValueError(f"TENANCY_MODE must be one of {TENANCY_MODES}, got {settings.TENANCY_MODE!r}")
+        # "collection": one Qdrant collection per tenant.
+        # "shared": all tenants in one collection, partitioned by the tenant_id payload field.
+        self.shared_tenancy = settings.TENANCY_MODE == "shared"
+
+        self.client = build_qdrant_client()
         # Using a small, fast local model for embeddings
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.vector_size = 384
+        self.model = load_model("embedding")
+        self.vector_size = VECTOR_SIZE
+        # Concurrent single-text embeddings are coalesced into one model.encode call
+        self.batcher = None
+        if settings.EMBEDDING_BATCHING_ENABLED:
+            self.batcher = MicroBatcher(
+                "embedding",
+                self.embed_texts,
+                max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+                max_wait_ms=settings.EMBEDDING_BATCH_MAX_WAIT_MS,
+                max_queue_size=settings.EXECUTOR_QUEUE_SIZE
+            )
+        # Repeated queries (dashboard refreshes, attack simulations) skip the model entirely
+        self.query_cache = None
+        if settings.QUERY_EMBEDDING_CACHE_SIZE > 0:
+            self.query_cache = LRUCache(
+                settings.QUERY_EMBEDDING_CACHE_SIZE,
+                ttl_seconds=settings.QUERY_EMBEDDING_CACHE_TTL_SECONDS
+            )
+        # Process-local registry of known collections, so upserts and searches
+        # do not list every collection on each call.
+        self._collections = set()
+        # In shared mode tenants are not collections, so they are tracked separately
+        self._shared_tenants = set()
+        self._collections_refreshed_at = 0.0
+        self._collections_lock = threading.Lock()
+
+    def collection_name(self, tenant_id: str) -> str:
+        if self.shared_tenancy:
+            return settings.SHARED_COLLECTION_NAME
+        return f"{TENANT_COLLECTION_PREFIX}{tenant_id}"
+
+    def refresh_collections(self):
+        """
+        Reloads the collection registry from Qdrant (startup, or when it may be stale).
+        """
+        names = {c.name for c in self.client.get_collections().collections}
+        shared_tenants = set()
+        if self.shared_tenancy and settings.SHARED_COLLECTION_NAME in names:
+            shared_tenants = self._load_shared_tenants(names)
+
+        with self._collections_lock:
+            self._collections = names
+            self._shared_tenants = shared_tenants
+            self._collections_refreshed_at = time.monotonic()
+
+    def forget_collection(self, collection_name: str):
+        with self._collections_lock:
+            self._collections.discard(collection_name)
 
     def ensure_collection(self, tenant_id: str):
         """
         Ensures a collection exists for the tenant.
+        Only talks to Qdrant when the collection is not in the registry yet.
         """
-        collection_name = f"tenant_{tenant_id}"
-        collections = self.client.get_collections().collections
-        exists = any(c.name == collection_name for c in collections)
-        
-        if not exists:
-            self.client.create_collection(
-                collection_name=collection_name,
-                vectors_config=models.VectorParams(size=self.vector_size, distance=models.Distance.COSINE)
-            )
+        collection_name = self.collection_name(tenant_id)
+        if collection_name in self._collections:
+            return
+
+        # Another worker may have created it since our last refresh
+        self.refresh_collections()
+        if collection_name in self._collections:
+            return
+
+        try:
+            if self.shared_tenancy:
+                create_shared_collection(self.client, collection_name, self.vector_size)
+            else:
+                self.client.create_collection(
+                    collection_name=collection_name,
+                    vectors_config=models.VectorParams(size=self.vector_size, distance=models.Distance.COSINE)
+                )
+        except Exception:
+            # Lost a creation race with another worker: fine if the collection exists now
+            self.refresh_collections()
+            if collection_name not in self._collections:
+                raise
+
+        with self._collections_lock:
+            self._collections.add(collection_name)
 
     def embed_text(self, text: str) -> list[float]:
+        if self.batcher:
+            return self.batcher.submit(text).result()
         return self.model.encode(text).tolist()
 
-    def upsert_vector(self, tenant_id: str, text: str, s3_uri: str, encrypted_dek: bytes):
+    def normalize_query(self, text: str) -> str:
+        # all-MiniLM-L6-v2 uses an uncased tokenizer that also splits on whitespace,
+        # so case and spacing changes produce the same embedding.
+        return " ".join(text.split()).lower()
+
+    def get_cached_query_vector(self, query_text: str):
+        if self.query_cache is None:
+            return None
+        return self.query_cache.get(self.normalize_query(query_text))
+
+    def cache_query_vector(self, query_text: str, vector: list[float]):
+        if self.query_cache is not None:
+            self.query_cache.put(self.normalize_query(query_text), vector)
+
+    def embed_query(self, query_text: str) -> list[float]:
+        """
+        Embeds a search query, going through the query embedding cache.
+        """
+        vector = self.get_cached_query_vector(query_text)
+        if vector is None:
+            vector = self.embed_text(query_text)
+            self.cache_query_vector(query_text, vector)
+        return vector
+
+    def query_cache_stats(self) -> dict:
+        return self.query_cache.stats() if self.query_cache is not None else {}
+
+    def batcher_stats(self) -> dict:
+        """
+        Batch fill and queue delay of the embedding micro-batcher (empty when disabled).
+        """
+        return self.batcher.stats() if self.batcher else {}
+
+    def embed_texts(self, texts: list[str], batch_size: int = 32) -> list[list[float]]:
+        """
+        Embeds many texts with batched forward passes.
+        """
+        return self.model.encode(texts, batch_size=batch_size).tolist()
+
+    def upsert_vector(self, tenant_id: str, text: str, s3_uri: str, encrypted_dek: bytes, vector: list[float] = None,
+                      metadata: dict = None):
         """
         Embeds text and stores the vector + metadata (S3 pointer, Encrypted DEK) in Qdrant.
+        Pass a precomputed vector to skip the embedding step.
+        metadata is added to the point's payload (e.g. the chunk's parent document).
         """
-        self.ensure_collection(tenant_id)
-        vector = self.embed_text(text)
-        point_id = str(uuid.uuid4())
-        
-        # We store the Encrypted DEK as a hex string in metadata so we can retrieve it later
-        encrypted_dek_hex = encrypted_dek.hex()
-
-        self.client.upsert(
-            collection_name=f"tenant_{tenant_id}",
-            points=[
-                models.PointStruct(
-                    id=point_id,
-                    vector=vector,
-                    payload={
-                        "s3_uri": s3_uri,
-                        "encrypted_dek_hex": encrypted_dek_hex
-                    }
-                )
-            ]
+        if vector is None:
+            vector = self.embed_text(text)
+        point = self._build_point(tenant_id, vector, s3_uri, encrypted_dek, metadata)
+
+        self._run_on_collection(
+            tenant_id,
+            lambda collection_name: self.client.upsert(collection_name=collection_name, points=[point])
         )
-        return point_id, vector
+        self._remember_tenant(tenant_id)
+        return point.id, vector
 
-    def search(self, tenant_id: str, query_text: str, limit: int = 3):
+    def upsert_vectors(self, tenant_id: str, texts: list[str], s3_uris: list[str], encrypted_deks: list[bytes],
+                       vectors: list[list[float]] = None, metadata: list[dict] = None):
+        """
+        Batched variant of upsert_vector: one encode call for all texts and
+        a single multi-point upsert to Qdrant.
+        Returns (point_ids, vectors) in input order.
+        """
+        if vectors is None:
+            vectors = self.embed_texts(texts)
+        if metadata is None:
+            metadata = [None] * len(texts)
+        points = [
+            self._build_point(tenant_id, vector, s3_uri, encrypted_dek, point_metadata)
+            for vector, s3_uri, encrypted_dek, point_metadata in zip(vectors, s3_uris, encrypted_deks, metadata)
+        ]
+
+        self._run_on_collection(
+            tenant_id,
+            lambda collection_name: self.client.upsert(collection_name=collection_name, points=points)
+        )
+        self._remember_tenant(tenant_id)
+        return [point.id for point in points], vectors
+
+    def _build_point(self, tenant_id: str, vector: list[float], s3_uri: str, encrypted_dek: bytes,
+                     metadata: dict = None) -> models.PointStruct:
+        # tenant_id is always stored so collections can be migrated to shared mode.
+        payload = {**(metadata or {}), "tenant_id": tenant_id, "s3_uri": s3_uri}
+        # Legacy Fernet objects: we store the Encrypted DEK as a hex string in metadata so we
+        # can retrieve it later. Envelope objects carry it themselves (encrypted_dek is None).
+        if encrypted_dek is not None:
+            payload["encrypted_dek_hex"] = encrypted_dek.hex()
+        return models.PointStruct(id=str(uuid.uuid4()), vector=vector, payload=payload)
+
+    def search(self, tenant_id: str, query_text: str = None, limit: int = 3, query_vector: list[float] = None,
+               with_vectors: bool = False):
         """
         Searches the tenant's collection.
+        Pass a precomputed query_vector to avoid embedding the query again.
+        with_vectors=True also returns each hit's stored vector (hit.vector).
         """
-        self.ensure_collection(tenant_id)
-        query_vector = self.embed_text(query_text)
+        if query_vector is None:
+            query_vector = self.embed_query(query_text)
         
-        results = self.client.search(
-            collection_name=f"tenant_{tenant_id}",
-            query_vector=query_vector,
-            limit=limit
+        results = self._run_on_collection(
+            tenant_id,
+            lambda collection_name: self.client.search(
+                collection_name=collection_name,
+                query_vector=query_vector,
+                query_filter=self._tenant_filter(tenant_id),
+                limit=limit,
+                with_vectors=with_vectors
+            )
         )
         return results, query_vector
 
+    def count_points(self, tenant_id: str) -> Optional[int]:
+        """
+        Exact number of the tenant's points, or None if its collection does not exist.
+        Ingest only ever adds points, so the count changes with every ingest, whichever
+        worker handled it. Read-only: unlike search, it never creates a collection.
+        """
+        try:
+            result = self.client.count(
+                collection_name=self.collection_name(tenant_id),
+                count_filter=self._tenant_filter(tenant_id),
+                exact=True
+            )
+        except Exception as e:
+            if _is_not_found(e):
+                return None
+            raise
+        return result.count
+
     def list_tenants(self) -> list[str]:
         """
         Returns a list of tenant IDs based on existing Qdrant collections.
+        Served from the collection registry, which is re-listed from Qdrant at most
+        every COLLECTION_REGISTRY_REFRESH_SECONDS to pick up other workers' tenants.
         """
-        response = self.client.get_collections()
+        if time.monotonic() - self._collections_refreshed_at > settings.COLLECTION_REGISTRY_REFRESH_SECONDS:
+            self.refresh_collections()
+
+        if self.shared_tenancy:
+            return sorted(self._shared_tenants)
+
         # Filter collections that start with "tenant_" and strip the prefix
-        tenants = []
-        for collection in response.collections:
-            if collection.name.startswith("tenant_"):
-                tenants.append(collection.name.replace("tenant_", ""))
+        return sorted(
+            name[len(TENANT_COLLECTION_PREFIX):]
+            for name in self._collections
+            if name.startswith(TENANT_COLLECTION_PREFIX)
+        )
+
+    def _tenant_filter(self, tenant_id: str):
+        """
+        In shared mode every search MUST be restricted to the caller's tenant_id,
+        otherwise results would bleed across tenants. Per-tenant collections need no filter.
+        """
+        if not self.shared_tenancy:
+            return None
+        return models.Filter(
+            must=[models.FieldCondition(key="tenant_id", match=models.MatchValue(value=tenant_id))]
+        )
+
+    def _remember_tenant(self, tenant_id: str):
+        """
+        In shared mode, records a tenant's first ingest in the tenant registry.
+        """
+        if not self.shared_tenancy or tenant_id in self._shared_tenants:
+            return
+        register_tenants(self.client, tenant_registry_name(settings.SHARED_COLLECTION_NAME), [tenant_id])
+        with self._collections_lock:
+            self._shared_tenants.add(tenant_id)
+
+    def _load_shared_tenants(self, names: set) -> set:
+        """
+        Reads the tenant registry. A shared collection created before the registry
+        existed is scanned once to build it.
+        """
+        registry_name = tenant_registry_name(settings.SHARED_COLLECTION_NAME)
+        if registry_name in names:
+            return scroll_tenant_ids(self.client, registry_name)
+
+        logger.info(f"Building tenant registry {registry_name} from {settings.SHARED_COLLECTION_NAME}...")
+        tenants = scroll_tenant_ids(self.client, settings.SHARED_COLLECTION_NAME)
+        ensure_tenant_registry(self.client, registry_name)
+        if tenants:
+            register_tenants(self.client, registry_name, tenants)
         return tenants
+
+    def _run_on_collection(self, tenant_id: str, operation):
+        """
+        Runs operation(collection_name) against the tenant's collection. If the
+        collection turns out to be gone (deleted behind the registry's back), the
+        registry entry is dropped, the collection recreated and the call retried once.
+        """
+        collection_name = self.collection_name(tenant_id)
+        self.ensure_collection(tenant_id)
+        try:
+            return operation(collection_name)
+        except Exception as e:
+            if not _is_not_found(e):
+                raise
+
+        self.forget_collection(collection_name)
+        self.ensure_collection(tenant_id)
+        return operation(collection_name)
+
+
+def _is_not_found(error: Exception) -> bool:
+    if isinstance(error, UnexpectedResponse):
+        return error.status_code == 404
+    # The local (in-memory / on-disk) client raises ValueError for unknown collections
+    return isinstance(error, ValueError) and "not found" in str(error)
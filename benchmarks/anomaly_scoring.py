@@ -0,0 +1,58 @@
+"""
+Compares per-row anomaly scoring (one is_anomalous call per query, as the
+query path did before) with batched scoring (one score_batch call).
+
+Usage (from the project root):
+    python -m benchmarks.anomaly_scoring [--rows 2000] [--batch-size 64]
+"""
+import argparse
+import time
+import numpy as np
+from app.core.config import settings
+
+# Keep the detector's background machinery out of the measurement
+settings.ANOMALY_BATCHING_ENABLED = False
+settings.ANOMALY_SNAPSHOT_BACKEND = "none"
+
+from app.services.anomaly_service import AnomalyDetector
+
+DIM = 384
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-row vs batched anomaly scoring throughput.")
+    parser.add_argument("--rows", type=int, default=2000, help="Query embeddings to score")
+    parser.add_argument("--batch-size", type=int, default=64, help="Rows per score_batch call")
+    parser.add_argument("--history", type=int, default=1000, help="Training samples for the tenant model")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    center = rng.normal(size=DIM)
+    history = (center + 0.1 * rng.normal(size=(args.history, DIM))).astype(np.float32)
+    queries = (center + 0.1 * rng.normal(size=(args.rows, DIM))).astype(np.float32)
+
+    detector = AnomalyDetector()
+    for row in history:
+        detector.log_query("bench", row)
+    detector._train_model("bench")
+    detector.close()
+
+    started = time.perf_counter()
+    per_row = [detector.is_anomalous("bench", row) for row in queries]
+    per_row_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batched = []
+    for start in range(0, args.rows, args.batch_size):
+        batched.extend(detector.is_anomalous_batch("bench", queries[start:start + args.batch_size]))
+    batched_seconds = time.perf_counter() - started
+
+    assert per_row == batched, "batched scoring must flag exactly the same rows"
+    print(f"rows={args.rows} batch_size={args.batch_size}")
+    print(f"per-row : {args.rows / per_row_seconds:10.1f} rows/s  ({per_row_seconds * 1000 / args.rows:.3f} ms/row)")
+    print(f"batched : {args.rows / batched_seconds:10.1f} rows/s  ({batched_seconds * 1000 / args.rows:.3f} ms/row)")
+    print(f"speedup : {per_row_seconds / batched_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Size and speed of the binary AES-256-GCM envelope (app/services/envelope.py) against
+the legacy Fernet format, for documents of several sizes. No KMS is involved: both
+formats use the same random DEK and a wrapped-DEK stand-in of --wrapped-dek-bytes
+(an AWS KMS AES_256 CiphertextBlob is about 184 bytes).
+
+Per document it reports:
+  - S3 object size (Fernet token vs envelope, which also carries the wrapped DEK)
+  - Qdrant payload bytes for the DEK (hex string for Fernet, none for the envelope)
+  - encrypt / decrypt time per object
+
+Correctness checks (exit status 1 on failure): both formats round-trip, and an
+envelope whose ciphertext, nonce, key id or wrapped DEK was altered is rejected.
+
+Usage (from the project root):
+    python -m benchmarks.envelope_format
+    python -m benchmarks.envelope_format --sizes 512 4096 65536 --repeat 2000
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+import uuid
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet
+from app.services import envelope
+
+
+def timed(fn, repeat):
+    fn()  # warm up
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - started) / repeat * 1e6
+
+
+def fernet_roundtrip(plaintext, dek, repeat):
+    # Same per-call work as EncryptionService: build the cipher from the DEK, then encrypt
+    def encrypt():
+        return Fernet(base64.urlsafe_b64encode(dek)).encrypt(plaintext)
+    token, encrypt_us = timed(encrypt, repeat)
+
+    def decrypt():
+        return Fernet(base64.urlsafe_b64encode(dek)).decrypt(token)
+    decrypted, decrypt_us = timed(decrypt, repeat)
+    return token, decrypted, encrypt_us, decrypt_us
+
+
+def envelope_roundtrip(plaintext, dek, wrapped_dek, key_id, repeat):
+    sealed, encrypt_us = timed(lambda: envelope.seal(plaintext, dek, wrapped_dek, key_id), repeat)
+    decrypted, decrypt_us = timed(lambda: envelope.unseal(envelope.parse(sealed), dek), repeat)
+    return sealed, decrypted, encrypt_us, decrypt_us
+
+
+def tamper_checks(dek, wrapped_dek, key_id) -> list[str]:
+    """
+    Flips one byte in each part of an envelope. Returns the parts whose change went unnoticed.
+    """
+    sealed = envelope.seal(b"tamper check", dek, wrapped_dek, key_id)
+    parsed = envelope.parse(sealed)
+    header_size = len(parsed.header)
+    nonce_at = parsed.header.index(parsed.nonce)
+    key_id_at = nonce_at + len(parsed.nonce)
+    positions = {
+        "nonce": nonce_at,
+        "key id": key_id_at,
+        "wrapped DEK": key_id_at + len(key_id),
+        "ciphertext": header_size,
+        "tag": len(sealed) - 1
+    }
+    undetected = []
+    for part, position in positions.items():
+        altered = bytearray(sealed)
+        altered[position] ^= 0x01
+        try:
+            envelope.unseal(envelope.parse(bytes(altered)), dek)
+            undetected.append(part)
+        except (InvalidTag, ValueError, UnicodeDecodeError):
+            pass
+    return undetected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Binary envelope vs Fernet: size and speed.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[256, 1024, 4096, 16384, 65536],
+                        help="Plaintext sizes in bytes")
+    parser.add_argument("--repeat", type=int, default=1000, help="Timed runs per size and operation")
+    parser.add_argument("--wrapped-dek-bytes", type=int, default=184)
+    args = parser.parse_args()
+
+    dek = os.urandom(32)
+    wrapped_dek = os.urandom(args.wrapped_dek_bytes)
+    key_id = str(uuid.uuid4())
+    # Qdrant stores payloads as JSON: the hex DEK costs its characters plus the key
+    hex_payload = len(json.dumps({"encrypted_dek_hex": wrapped_dek.hex()}))
+
+    failures = []
+    print(f"{'size':>7}  {'fernet B':>9}  {'envelope B':>10}  {'saved':>6}  "
+          f"{'enc fernet us':>13}  {'enc env us':>10}  {'dec fernet us':>13}  {'dec env us':>10}")
+    for size in args.sizes:
+        plaintext = os.urandom(size // 2).hex().encode()[:size]
+        token, fernet_plain, fernet_enc, fernet_dec = fernet_roundtrip(plaintext, dek, args.repeat)
+        sealed, envelope_plain, envelope_enc, envelope_dec = envelope_roundtrip(
+            plaintext, dek, wrapped_dek, key_id, args.repeat
+        )
+        if fernet_plain != plaintext:
+            failures.append(f"Fernet round trip failed at {size} bytes")
+        if envelope_plain != plaintext:
+            failures.append(f"Envelope round trip failed at {size} bytes")
+
+        # Fernet objects also need the hex DEK in Qdrant; envelopes need nothing there
+        fernet_total = len(token) + hex_payload
+        saved = 1 - len(sealed) / fernet_total
+        print(f"{size:>7}  {len(token):>9}  {len(sealed):>10}  {saved:>6.1%}  "
+              f"{fernet_enc:>13.1f}  {envelope_enc:>10.1f}  {fernet_dec:>13.1f}  {envelope_dec:>10.1f}")
+
+    print(f"\nQdrant payload per point: {hex_payload} bytes of hex DEK (Fernet) vs 0 (envelope)")
+    print("'saved' compares the envelope with the Fernet token plus that payload.")
+
+    undetected = tamper_checks(dek, wrapped_dek, key_id)
+    failures.extend(f"Altered {part} was not detected" for part in undetected)
+
+    if failures:
+        print("\nFAILED:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("\nRound trips and tamper checks passed")
+
+
+if __name__ == "__main__":
+    main()
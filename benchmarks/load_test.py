@@ -0,0 +1,284 @@
+"""
+End-to-end load benchmark: drives /ingest (or /ingest/batch) and then /query at a
+fixed concurrency across several tenants, and reports p50 / p95 / p99 latency,
+throughput and the per-stage breakdown the API returns in timings_ms.
+
+Targets:
+  --url http://host:8000   a running server (LocalStack + Qdrant behind it)
+  (default)                the app in this process on a free port, with S3 / KMS
+                           mocked by moto (--aws moto, needs `pip install "moto[s3,kms]"`)
+                           or LocalStack (--aws localstack), and Qdrant in memory
+                           (--qdrant memory) or the server from docker-compose (--qdrant server).
+                           --stub-models replaces the transformer models with cheap
+                           stand-ins (benchmarks/stub_models.py) to measure everything else.
+
+Results are saved as JSON (--output). With --baseline, p95 latencies and throughput
+are compared against an earlier result file, and the exit status is 1 when any
+phase regressed by more than --tolerance.
+
+Usage (from the project root):
+    python -m benchmarks.load_test --stub-models --tenants 4 --concurrency 8 --output bench.json
+    python -m benchmarks.load_test --stub-models --baseline bench.json
+    python -m benchmarks.load_test --url http://localhost:8000 --docs-per-tenant 20 --queries 500
+"""
+import argparse
+import json
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+
+FIRST_NAMES = ["Alice", "Bruno", "Chen", "Dana", "Emeka", "Farah", "Gustav", "Hana"]
+LAST_NAMES = ["Smith", "Okafor", "Tanaka", "Muller", "Garcia", "Novak", "Haddad", "Larsen"]
+TOPICS = ["budget", "roadmap", "hiring plan", "security audit", "vendor contract", "leave policy", "launch date", "pricing"]
+CITIES = ["Berlin", "Lagos", "Osaka", "Denver", "Madrid", "Prague", "Dubai", "Oslo"]
+
+
+def make_document(rng) -> str:
+    return (
+        f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} approved the {rng.choice(TOPICS)} "
+        f"for the {rng.choice(CITIES)} office. Contact {rng.choice(FIRST_NAMES).lower()}@example.com "
+        f"for details. The figure is {rng.integers(1, 100)}M and the review is due in {rng.integers(1, 12)} weeks."
+    )
+
+
+def make_query(rng, distinct: int) -> str:
+    # distinct bounds how many different questions are asked, i.e. how often they repeat
+    i = int(rng.integers(distinct))
+    return f"What is the {TOPICS[i % len(TOPICS)]} for the {CITIES[(i // len(TOPICS)) % len(CITIES)]} office?"
+
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)), 2) if values else None
+
+
+def summarize(samples, elapsed):
+    """
+    samples: (latency_ms, ok, timings_ms) per request.
+    """
+    latencies = [latency for latency, ok, _ in samples if ok]
+    stages = {}
+    for _, ok, timings in samples:
+        if ok:
+            for stage, ms in (timings or {}).items():
+                stages.setdefault(stage, []).append(ms)
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for _, ok, _ in samples if not ok),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "mean": round(float(np.mean(latencies)), 2) if latencies else None,
+            "max": round(max(latencies), 2) if latencies else None
+        },
+        "stages_ms": {
+            stage: {"p50": percentile(values, 50), "p95": percentile(values, 95), "mean": round(float(np.mean(values)), 2)}
+            for stage, values in sorted(stages.items())
+        }
+    }
+
+
+def run_phase(base_url, calls, concurrency, timeout):
+    """
+    Sends every (path, body) in calls with `concurrency` requests in flight.
+    """
+    local = threading.local()
+
+    def send(call):
+        path, body = call
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            response = local.session.post(base_url + path, json=body, timeout=timeout)
+            latency = (time.perf_counter() - started) * 1000
+            if response.status_code != 200:
+                return latency, False, None
+            return latency, True, response.json().get("timings_ms")
+        except requests.RequestException:
+            return (time.perf_counter() - started) * 1000, False, None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(send, calls))
+    return summarize(samples, time.perf_counter() - started)
+
+
+def wait_ready(base_url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            response = requests.get(f"{base_url}/api/v1/ready", timeout=5)
+            # Older servers have no readiness endpoint: treat a 404 as ready
+            if response.status_code in (200, 404):
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{base_url} was not ready after {timeout}s")
+
+
+def start_in_process(args) -> str:
+    """
+    Configures local stand-ins, then serves the app from a background thread.
+    Returns the base URL.
+    """
+    from app.core.config import settings
+
+    if args.stub_models:
+        from benchmarks import stub_models
+        stub_models.install(delay_ms=args.stub_delay_ms)
+    if args.qdrant == "memory":
+        settings.QDRANT_LOCATION = ":memory:"
+
+    if args.aws == "moto":
+        try:
+            from moto import mock_aws
+            mock = mock_aws()
+        except ImportError:
+            try:
+                from moto import mock_kms, mock_s3
+            except ImportError:
+                sys.exit('--aws moto needs moto: pip install "moto[s3,kms]"')
+            mock = _MockGroup(mock_s3(), mock_kms())
+        mock.start()
+        settings.AWS_ENDPOINT_URL = None
+        import boto3
+        boto3.client("s3", region_name=settings.AWS_REGION).create_bucket(Bucket=settings.S3_BUCKET_NAME)
+
+    import uvicorn
+    from app.main import app
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="benchmark-server", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+class _MockGroup:
+    def __init__(self, *mocks):
+        self.mocks = mocks
+
+    def start(self):
+        for mock in self.mocks:
+            mock.start()
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"python": platform.python_version(), "platform": platform.platform(), "git_commit": commit}
+
+
+def compare(results, baseline, tolerance) -> list[str]:
+    """
+    Lists the phases whose p95 latency rose, or throughput fell, by more than tolerance.
+    """
+    regressions = []
+    for phase, current in results["phases"].items():
+        previous = baseline.get("phases", {}).get(phase)
+        if not previous:
+            continue
+        p95, old_p95 = current["latency_ms"]["p95"], previous["latency_ms"]["p95"]
+        if p95 and old_p95 and p95 > old_p95 * (1 + tolerance):
+            regressions.append(f"{phase}: p95 {old_p95} -> {p95} ms")
+        rps, old_rps = current["throughput_rps"], previous["throughput_rps"]
+        if old_rps and rps < old_rps * (1 - tolerance):
+            regressions.append(f"{phase}: throughput {old_rps} -> {rps} req/s")
+    return regressions
+
+
+def print_phase(name, summary):
+    latency = summary["latency_ms"]
+    print(f"\n{name}: {summary['requests']} requests, {summary['errors']} errors, "
+          f"{summary['throughput_rps']} req/s over {summary['elapsed_s']}s")
+    print(f"  latency ms  p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}")
+    for stage, stats in summary["stages_ms"].items():
+        print(f"  {stage:<16} p50 {stats['p50']:>9}  p95 {stats['p95']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end ingest / query load benchmark.")
+    parser.add_argument("--url", help="Base URL of a running server; default runs the app in-process")
+    parser.add_argument("--aws", choices=["moto", "localstack"], default="moto", help="In-process S3 / KMS backend")
+    parser.add_argument("--qdrant", choices=["memory", "server"], default="memory", help="In-process Qdrant")
+    parser.add_argument("--stub-models", action="store_true", help="In-process: replace the transformer models with stand-ins")
+    parser.add_argument("--stub-delay-ms", type=float, default=0.0, help="Simulated cost of each stub model call")
+    parser.add_argument("--tenants", type=int, default=4)
+    parser.add_argument("--docs-per-tenant", type=int, default=50)
+    parser.add_argument("--ingest-batch-size", type=int, default=0, help="Use /ingest/batch with this many documents per request (0: /ingest)")
+    parser.add_argument("--queries", type=int, default=400)
+    parser.add_argument("--distinct-queries", type=int, default=64, help="Distinct questions (lower means more repeats)")
+    parser.add_argument("--top-k", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout (seconds)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression vs the baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip("/") if args.url else start_in_process(args)
+    wait_ready(base_url, timeout=600)
+
+    rng = np.random.default_rng(args.seed)
+    tenants = [f"bench_{i}" for i in range(args.tenants)]
+
+    ingest_calls = []
+    for tenant in tenants:
+        documents = [make_document(rng) for _ in range(args.docs_per_tenant)]
+        if args.ingest_batch_size:
+            for start in range(0, len(documents), args.ingest_batch_size):
+                ingest_calls.append(("/api/v1/ingest/batch", {"tenant_id": tenant, "documents": documents[start:start + args.ingest_batch_size]}))
+        else:
+            ingest_calls.extend(("/api/v1/ingest", {"tenant_id": tenant, "text": text}) for text in documents)
+    rng.shuffle(ingest_calls)
+
+    query_calls = []
+    for _ in range(args.queries):
+        body = {"tenant_id": tenants[int(rng.integers(len(tenants)))], "query": make_query(rng, args.distinct_queries)}
+        if args.top_k:
+            body["top_k"] = args.top_k
+        query_calls.append(("/api/v1/query", body))
+
+    config = {k: v for k, v in vars(args).items() if k not in ("output", "baseline")}
+    results = {"config": config, "environment": environment(), "phases": {}}
+    results["phases"]["ingest"] = run_phase(base_url, ingest_calls, args.concurrency, args.timeout)
+    print_phase("ingest", results["phases"]["ingest"])
+    results["phases"]["query"] = run_phase(base_url, query_calls, args.concurrency, args.timeout)
+    print_phase("query", results["phases"]["query"])
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        changed = sorted(k for k, v in config.items() if k != "tolerance" and baseline.get("config", {}).get(k) != v)
+        if changed:
+            print(f"\nWarning: the baseline ran with different settings ({', '.join(changed)})")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nREGRESSIONS:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} of the baseline")
+
+
+if __name__ == "__main__":
+    main()
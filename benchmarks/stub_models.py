@@ -0,0 +1,103 @@
+"""
+Lightweight stand-ins for the transformer models, so the load benchmark can drive
+the whole pipeline (services, executors, batchers, caches, S3 / KMS / Qdrant calls)
+without downloading or running real models. They are deterministic and cheap,
+and optionally sleep to simulate model cost.
+
+They cover /ingest, /ingest/batch and /query (not /query/stream).
+"""
+import hashlib
+import re
+import time
+from functools import lru_cache
+import numpy as np
+from app.services.inference_backend import set_model
+
+DIM = 384
+WORD = re.compile(r"\S+")
+# Capitalized word pairs stand in for person / organization names
+NAME = re.compile(r"\b[A-Z][a-z]+ [A-Z][a-z]+\b")
+
+
+def _offsets(text):
+    return [(m.start(), m.end()) for m in WORD.finditer(text)]
+
+
+@lru_cache(maxsize=100_000)
+def _word_vector(word: str) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(word.encode()).digest()[:8], "little")
+    return np.random.default_rng(seed).normal(size=DIM).astype(np.float32)
+
+
+class StubTokenizer:
+    """Whitespace tokenizer with the call signatures the services use."""
+    def __call__(self, text, add_special_tokens=True, return_offsets_mapping=False, **kwargs):
+        if isinstance(text, list):
+            return {"offset_mapping": [_offsets(t) for t in text], "input_ids": [list(range(len(_offsets(t)))) for t in text]}
+        offsets = _offsets(text)
+        return {"offset_mapping": offsets, "input_ids": list(range(len(offsets) + int(add_special_tokens)))}
+
+
+class StubNER:
+    def __init__(self, delay_ms: float = 0.0):
+        self.tokenizer = StubTokenizer()
+        self.delay = delay_ms / 1000
+
+    def _entities(self, text):
+        return [{"entity_group": "PER", "start": m.start(), "end": m.end(), "word": m.group(), "score": 0.99}
+                for m in NAME.finditer(text)]
+
+    def __call__(self, texts, batch_size=None, **kwargs):
+        time.sleep(self.delay)
+        if isinstance(texts, str):
+            return self._entities(texts)
+        return [self._entities(t) for t in texts]
+
+
+class StubEmbedding:
+    """Bag-of-words hashing embedding: texts sharing words get similar vectors."""
+    def __init__(self, delay_ms: float = 0.0):
+        self.tokenizer = StubTokenizer()
+        self.delay = delay_ms / 1000
+
+    def _embed(self, text):
+        words = text.lower().split() or [""]
+        vector = np.sum([_word_vector(w) for w in words], axis=0)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs):
+        time.sleep(self.delay)
+        if isinstance(sentences, str):
+            return self._embed(sentences)
+        if not sentences:
+            return np.zeros((0, DIM), np.float32)
+        return np.stack([self._embed(t) for t in sentences])
+
+
+class StubLLM:
+    """Answers with the first words of the context."""
+    def __init__(self, delay_ms: float = 0.0):
+        self.tokenizer = StubTokenizer()
+        self.delay = delay_ms / 1000
+
+    def __call__(self, prompt, **kwargs):
+        time.sleep(self.delay)
+        context = prompt.split(" context: ", 1)[-1]
+        return [{"generated_text": " ".join(context.split()[:12])}]
+
+
+class StubReranker:
+    """Scores passages by word overlap with the query."""
+    def predict(self, pairs):
+        return [len(set(q.lower().split()) & set(p.lower().split())) for q, p in pairs]
+
+
+def install(delay_ms: float = 0.0):
+    """
+    Registers the stand-ins with the inference backend. delay_ms is slept on every
+    model call (NER, embedding and LLM) to simulate inference cost.
+    """
+    set_model("ner", StubNER(delay_ms))
+    set_model("embedding", StubEmbedding(delay_ms))
+    set_model("llm", StubLLM(delay_ms))
+    set_model("reranker", StubReranker())
@@ -100,6 +100,8 @@ if mode == "Honest Tenant View":
                         st.markdown(f"**1. PII Redaction:** `{data['scrubbed_preview']}`")
                         st.markdown(f"**2. S3 Storage (Encrypted):** `{data['s3_uri']}`")
                         st.markdown(f"**3. Vector ID:** `{data['point_id']}`")
+                        if data.get('chunks', 1) > 1:
+                            st.markdown(f"**Chunks:** {data['chunks']} (document `{data['doc_id']}`)")
                 else:
                     st.error(f"Error: {response.text}")
             except Exception as e:
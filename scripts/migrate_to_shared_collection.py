@@ -0,0 +1,102 @@
+"""
+Moves per-tenant Qdrant collections (tenant_{id}) into the shared multi-tenant
+collection used by TENANCY_MODE="shared".
+
+Points keep their IDs, vectors and payload (S3 pointer + encrypted DEK); the
+tenant_id payload field is set from the source collection name, and each tenant
+is added to the shared collection's tenant registry. S3 objects and KMS keys are
+untouched.
+
+The store is the one the API is configured for (QDRANT_LOCATION, else
+QDRANT_HOST / QDRANT_PORT).
+
+Usage (from the project root):
+    python -m scripts.migrate_to_shared_collection [--dry-run] [--delete-source]
+
+Restart the API with TENANCY_MODE=shared once the migration has finished.
+"""
+import argparse
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from app.core.config import settings
+from app.services.vector_service import (
+    TENANT_COLLECTION_PREFIX, VECTOR_SIZE, build_qdrant_client, create_shared_collection, ensure_tenant_registry,
+    register_tenants, tenant_registry_name
+)
+
+
+def migrate_collection(client: QdrantClient, source: str, target: str, batch_size: int, dry_run: bool) -> int:
+    tenant_id = source[len(TENANT_COLLECTION_PREFIX):]
+    migrated = 0
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=source,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True
+        )
+        if points and not dry_run:
+            client.upsert(
+                collection_name=target,
+                points=[
+                    models.PointStruct(id=p.id, vector=p.vector, payload={**(p.payload or {}), "tenant_id": tenant_id})
+                    for p in points
+                ]
+            )
+        migrated += len(points)
+        if offset is None:
+            return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate per-tenant collections into the shared collection.")
+    parser.add_argument("--target", default=settings.SHARED_COLLECTION_NAME, help="Shared collection name")
+    parser.add_argument("--batch-size", type=int, default=256, help="Points per scroll / upsert batch")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the points that would be moved")
+    parser.add_argument("--delete-source", action="store_true", help="Delete each tenant collection after it is copied")
+    args = parser.parse_args()
+
+    # Same store the API uses: a Qdrant server, or the embedded one at QDRANT_LOCATION.
+    # Stop the API first in embedded mode; the local store allows a single client.
+    client = build_qdrant_client()
+    names = [c.name for c in client.get_collections().collections]
+    sources = sorted(name for name in names if name.startswith(TENANT_COLLECTION_PREFIX))
+
+    if args.target not in names and not args.dry_run:
+        print(f"Creating shared collection {args.target}...")
+        create_shared_collection(client, args.target, VECTOR_SIZE)
+    registry_name = tenant_registry_name(args.target)
+    if not args.dry_run:
+        ensure_tenant_registry(client, registry_name)
+
+    total = 0
+    for source in sources:
+        count = migrate_collection(client, source, args.target, args.batch_size, args.dry_run)
+        total += count
+        print(f"{source}: {count} points {'would be ' if args.dry_run else ''}migrated")
+        if count and not args.dry_run:
+            register_tenants(client, registry_name, [source[len(TENANT_COLLECTION_PREFIX):]])
+
+        if args.delete_source and not args.dry_run:
+            # Only delete once the target holds every point of this tenant
+            copied = client.count(
+                collection_name=args.target,
+                count_filter=models.Filter(must=[models.FieldCondition(
+                    key="tenant_id",
+                    match=models.MatchValue(value=source[len(TENANT_COLLECTION_PREFIX):])
+                )]),
+                exact=True
+            ).count
+            if copied >= count:
+                client.delete_collection(source)
+                print(f"{source}: deleted")
+            else:
+                print(f"{source}: NOT deleted, only {copied}/{count} points found in {args.target}")
+
+    print(f"Done: {total} points from {len(sources)} tenant collections.")
+
+
+if __name__ == "__main__":
+    main()
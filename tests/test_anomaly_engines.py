@@ -0,0 +1,59 @@
+import pickle
+import numpy as np
+import pytest
+from app.services.anomaly_engines import AnomalyEngine, CentroidEngine, IsolationForestEngine
+from app.core.config import settings
+from app.services.anomaly_store import AnomalySnapshotStore, LocalSnapshotStore, build_snapshot_store
+
+
+def normal_rows(count, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, dim))
+
+
+def test_base_classes_are_abstract():
+    with pytest.raises(TypeError):
+        AnomalyEngine()
+    with pytest.raises(TypeError):
+        AnomalySnapshotStore()
+
+
+def test_isolation_forest_partial_fit_is_a_no_op():
+    engine = IsolationForestEngine()
+    engine.fit(normal_rows(50))
+    before = engine.score_samples(normal_rows(5, seed=1))
+    engine.partial_fit(normal_rows(1, seed=2))
+    assert np.array_equal(engine.score_samples(normal_rows(5, seed=1)), before)
+
+
+def test_centroid_partial_fit_matches_fit():
+    rows = normal_rows(200)
+    online, batch = CentroidEngine(), CentroidEngine()
+    online.partial_fit(rows)
+    batch.fit(rows)
+    assert online.stats.count == batch.stats.count == 200
+    assert np.allclose(online.stats.mean, batch.stats.mean)
+    assert np.allclose(online.stats.m2, batch.stats.m2)
+
+
+def test_centroid_unpickles_snapshots_with_attribute_stats():
+    engine = CentroidEngine()
+    engine.partial_fit(normal_rows(40))
+    legacy = CentroidEngine.__new__(CentroidEngine)
+    legacy.__dict__.update({k: v for k, v in engine.__dict__.items() if k != "stats"})
+    legacy.__dict__.update(engine.stats._asdict())
+
+    restored = pickle.loads(pickle.dumps(legacy))
+    assert restored.stats.count == 40
+    assert np.array_equal(restored.score_samples(np.ones((1, 8))), engine.score_samples(np.ones((1, 8))))
+
+
+@pytest.mark.parametrize("backend", ["none", "local"])
+def test_snapshot_store_builds_storage_service_only_for_s3(backend, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "ANOMALY_SNAPSHOT_BACKEND", backend)
+    monkeypatch.setattr(settings, "ANOMALY_SNAPSHOT_DIR", str(tmp_path))
+
+    def storage_service():
+        raise AssertionError("StorageService built for a non-S3 snapshot backend")
+
+    store = build_snapshot_store(storage_service)
+    assert store is None if backend == "none" else isinstance(store, LocalSnapshotStore)
@@ -0,0 +1,42 @@
+from app.services.answer_cache import AnswerCache
+
+
+class PlainEncryption:
+    def encrypt_text(self, tenant_id, text):
+        return {"ciphertext": text.encode(), "encrypted_dek": None}
+
+    def decrypt_text(self, ciphertext, encrypted_dek, tenant_id):
+        return ciphertext.decode()
+
+
+def build_cache(counts, reads):
+    def freshness(tenant_id):
+        reads.append(tenant_id)
+        return counts[tenant_id]
+    return AnswerCache(PlainEncryption(), max_entries=8, max_tenants=8, ttl_seconds=60,
+                       similarity=0.9, freshness=freshness)
+
+
+def test_miss_does_not_read_freshness():
+    reads = []
+    cache = build_cache({"a": 1}, reads)
+    assert cache.get("a", [1.0, 0.0], ())[0] is None
+    assert reads == []
+
+
+def test_ingest_through_another_worker_makes_entries_stale():
+    counts, reads = {"a": 1}, []
+    cache = build_cache(counts, reads)
+    generation = cache.get("a", [1.0, 0.0], ())[1][0]
+    cache.put("a", [1.0, 0.0], (), {"generated_answer": "x"}, (generation, cache.read_freshness("a")))
+    assert cache.get("a", [1.0, 0.0], ())[0]["generated_answer"] == "x"
+
+    counts["a"] = 2
+    assert cache.get("a", [1.0, 0.0], ())[0] is None
+    assert cache.stats()["size"] == 0
+
+
+def test_answer_without_freshness_token_is_not_stored():
+    cache = build_cache({"a": None}, [])
+    cache.put("a", [1.0, 0.0], (), {"generated_answer": "x"}, (0, None))
+    assert cache.stats()["size"] == 0
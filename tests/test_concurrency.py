@@ -0,0 +1,42 @@
+import asyncio
+import threading
+import pytest
+from app.core.concurrency import map_concurrently
+from app.core.executors import BoundedExecutor, ExecutorSaturated
+
+
+def test_in_flight_never_goes_negative():
+    executor = BoundedExecutor("test", max_workers=4, queue_size=1000)
+    seen = []
+    futures = [executor.submit(lambda: seen.append(executor.stats()["in_flight"])) for _ in range(500)]
+    for future in futures:
+        future.result()
+    assert min(seen) >= 1
+    assert executor.stats()["in_flight"] == 0
+    executor.shutdown()
+
+
+def test_map_concurrently_returns_results_and_errors_in_order():
+    executor = BoundedExecutor("test", max_workers=2, queue_size=10)
+
+    def half(n):
+        if n % 2:
+            raise ValueError(n)
+        return n // 2
+
+    results = asyncio.run(map_concurrently(executor, half, [(n,) for n in range(6)], max_concurrency=3))
+    assert [r if not isinstance(r, Exception) else "error" for r in results] == [0, "error", 1, "error", 2, "error"]
+    executor.shutdown()
+
+
+def test_map_concurrently_raises_when_the_executor_is_full():
+    executor = BoundedExecutor("test", max_workers=1, queue_size=0)
+    release = threading.Event()
+    blocker = executor.submit(release.wait)
+    try:
+        with pytest.raises(ExecutorSaturated):
+            asyncio.run(map_concurrently(executor, str, [(1,), (2,)]))
+    finally:
+        release.set()
+        blocker.result()
+        executor.shutdown()
@@ -0,0 +1,59 @@
+import pytest
+
+moto = pytest.importorskip("moto")
+
+from app.core import aws
+from app.core.config import settings
+from app.services.encryption_service import EncryptionService
+
+
+@pytest.fixture
+def kms(monkeypatch):
+    mock = moto.mock_aws() if hasattr(moto, "mock_aws") else moto.mock_kms()
+    mock.start()
+    monkeypatch.setattr(settings, "AWS_ENDPOINT_URL", None)
+    monkeypatch.setattr(settings, "DEK_CACHE_ENABLED", False)
+    aws.reset_clients()
+    yield aws.get_client("kms")
+    aws.reset_clients()
+    mock.stop()
+
+
+def rotate(kms, tenant_id):
+    """Points the tenant's alias at a new key, as a key rotation would."""
+    key_id = kms.create_key(Tags=[{"TagKey": "TenantID", "TagValue": tenant_id}])["KeyMetadata"]["KeyId"]
+    kms.update_alias(AliasName=f"alias/tenant_{tenant_id}", TargetKeyId=key_id)
+
+
+@pytest.mark.parametrize("encryption_format", ["envelope", "fernet"])
+def test_old_objects_decrypt_after_alias_rotation(kms, monkeypatch, encryption_format):
+    monkeypatch.setattr(settings, "ENCRYPTION_FORMAT", encryption_format)
+    old = EncryptionService().encrypt_text("a", "before rotation")
+
+    rotate(kms, "a")
+    service = EncryptionService()  # e.g. a worker started after the rotation
+    new = service.encrypt_text("a", "after rotation")
+
+    assert service.decrypt_text(old["ciphertext"], old["encrypted_dek"], "a") == "before rotation"
+    assert service.decrypt_text(new["ciphertext"], new["encrypted_dek"], "a") == "after rotation"
+
+
+@pytest.mark.parametrize("encryption_format", ["envelope", "fernet"])
+def test_other_tenants_objects_are_rejected(kms, monkeypatch, encryption_format):
+    monkeypatch.setattr(settings, "ENCRYPTION_FORMAT", encryption_format)
+    service = EncryptionService()
+    service.encrypt_text("b", "warm up b's key")
+    sealed = service.encrypt_text("a", "tenant a only")
+
+    with pytest.raises(ValueError):
+        service.decrypt_text(sealed["ciphertext"], sealed["encrypted_dek"], "b")
+
+
+def test_reading_for_an_unknown_tenant_creates_no_key(kms):
+    service = EncryptionService()
+    sealed = service.encrypt_text("a", "tenant a only")
+    keys = len(kms.list_keys()["Keys"])
+
+    with pytest.raises(ValueError):
+        service.decrypt_text(sealed["ciphertext"], sealed["encrypted_dek"], "nobody")
+    assert len(kms.list_keys()["Keys"]) == keys
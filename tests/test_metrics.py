@@ -0,0 +1,46 @@
+import pytest
+from app.core.executors import BoundedExecutor, ExecutorSaturated
+from app.core.metrics import STAGE_ERRORS, count_saturation, observe_stage
+
+
+def _errors(stage: str, reason: str) -> float:
+    return sum(value for _, labels, value in STAGE_ERRORS.samples()
+               if labels["stage"] == stage and labels["reason"] == reason)
+
+
+def _saturate(executor: BoundedExecutor):
+    executor._slots.acquire(blocking=False)
+    executor.submit(print)
+
+
+def test_saturation_is_counted_once_in_the_innermost_stage():
+    executor = BoundedExecutor("metrics-test", max_workers=1, queue_size=0)
+    before_inner, before_outer = _errors("inner", "saturated"), _errors("outer", "saturated")
+    with pytest.raises(ExecutorSaturated) as info:
+        with observe_stage("outer", "tenant-a"):
+            with observe_stage("inner", "tenant-a"):
+                _saturate(executor)
+    assert info.value.stage == "inner"
+    # The endpoint's 503 path sees an already counted exception
+    count_saturation(info.value, "tenant-a")
+    assert _errors("inner", "saturated") == before_inner + 1
+    assert _errors("outer", "saturated") == before_outer
+    executor.shutdown()
+
+
+def test_saturation_outside_a_stage_is_labeled_with_the_executor():
+    executor = BoundedExecutor("metrics-test-io", max_workers=1, queue_size=0)
+    before = _errors("metrics-test-io", "saturated")
+    with pytest.raises(ExecutorSaturated) as info:
+        _saturate(executor)
+    count_saturation(info.value, "tenant-a")
+    assert _errors("metrics-test-io", "saturated") == before + 1
+    executor.shutdown()
+
+
+def test_stage_failures_are_counted_as_errors():
+    before = _errors("failing", "error")
+    with pytest.raises(ValueError):
+        with observe_stage("failing", "tenant-a"):
+            raise ValueError("boom")
+    assert _errors("failing", "error") == before + 1
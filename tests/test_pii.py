@@ -0,0 +1,39 @@
+import pytest
+from app.core.config import settings
+from app.services.pii_patterns import find_structured_pii
+from app.services.pii_service import PIIScrubber
+
+
+def labels(text):
+    return [label for _, _, label in find_structured_pii(text)]
+
+
+@pytest.mark.parametrize("text", [
+    "+44 20 7946 0958",
+    "+1 555 123 4567",
+    "+15551234567",
+    "(555) 123-4567",
+    "555.123.4567",
+    "555-123-4567",
+])
+def test_phone_numbers_are_found(text):
+    assert labels(f"call {text} today") == ["PHONE"]
+
+
+@pytest.mark.parametrize("text", [
+    "1999 2000 2001",
+    "in 2019 and 2020",
+    "2023-1234-5678",
+    "order 12345678",
+    "555-123.4567",
+])
+def test_years_and_id_like_runs_are_not_phones(text):
+    assert "PHONE" not in labels(text)
+
+
+@pytest.mark.parametrize("overlap", [256, 300, -1])
+def test_scrubber_rejects_overlap_not_below_window(monkeypatch, overlap):
+    monkeypatch.setattr(settings, "PII_CHUNK_TOKENS", 256)
+    monkeypatch.setattr(settings, "PII_CHUNK_OVERLAP", overlap)
+    with pytest.raises(ValueError):
+        PIIScrubber()